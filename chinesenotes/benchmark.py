@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Throughput benchmarks for the dictionary-based tokenizers.
+
+Runs each tokenizer over the sentences of the corpus and over synthetic text
+built from random dictionary terms, reporting characters and tokens per second,
+peak memory and per-sentence latency percentiles. The parallel tokenizer
+cndict.tokenize_many is also timed with increasing numbers of processes, to
+show how its throughput scales with cores. The results are written as JSON so
+that they can be compared across releases.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Callable, List, Mapping
+
+from chinesenotes import cndict
+from chinesenotes.cndict_types import DictionaryEntry
+
+CORPUS_DIRS_DEF = ['corpus/shijing', 'corpus/shangshu']
+MI_FILE_DEF = 'data/corpus/analysis/mutual_info.tsv'
+OUTFILE_DEF = 'benchmark.json'
+PROCESSES_DEF = [1, 2, 4]
+SYNTHETIC_CHARS_DEF = 100000
+
+# Tokenizers to compare. Each factory takes a dictionary and returns a function
+# that tokenizes a chunk of text, so that any setup is not timed.
+SEGMENTERS = {
+  'tokenize_greedy': lambda wdict: partial(cndict.tokenize_greedy, wdict),
+  'tokenize_greedy_skip_non_cjk': lambda wdict: partial(
+      cndict.tokenize_greedy, wdict, skip_non_cjk=True),
+  'tokenize_exclude_whole': lambda wdict: partial(cndict.tokenize_exclude_whole,
+                                                  wdict),
+  'tokenize_stream': lambda wdict: _stream_segmenter(wdict),
+  'tokenize_filtered': lambda wdict: partial(
+      cndict.tokenize_filtered, wdict,
+      rejected=cndict.load_rejected_bigrams(MI_FILE_DEF)),
+}
+
+
+def benchmark_segmenter(segmenter: Callable[[str], List[str]],
+                        sentences: List[str]) -> dict:
+  """Times a tokenizer over a list of sentences
+
+  The timing pass and the memory pass are run separately because tracing
+  memory allocations slows the tokenizer down.
+
+  Args:
+    segmenter: the tokenizer to benchmark
+    sentences: the sentences to tokenize
+  Returns:
+    A dictionary of results
+  """
+  latencies = []
+  num_tokens = 0
+  start = time.perf_counter()
+  for sentence in sentences:
+    t0 = time.perf_counter()
+    num_tokens += len(segmenter(sentence))
+    latencies.append(time.perf_counter() - t0)
+  elapsed = time.perf_counter() - start
+  tracemalloc.start()
+  for sentence in sentences:
+    segmenter(sentence)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  num_chars = sum(len(sentence) for sentence in sentences)
+  return {
+    'sentences': len(sentences),
+    'chars': num_chars,
+    'tokens': num_tokens,
+    'seconds': elapsed,
+    'chars_per_sec': num_chars / elapsed if elapsed else 0.0,
+    'tokens_per_sec': num_tokens / elapsed if elapsed else 0.0,
+    'peak_memory_bytes': peak,
+    'p50_latency_ms': percentile(latencies, 50) * 1000,
+    'p99_latency_ms': percentile(latencies, 99) * 1000,
+  }
+
+
+def benchmark_processes(wdict: Mapping[str, DictionaryEntry],
+                        sentences: List[str],
+                        processes: List[int]) -> dict:
+  """Times cndict.tokenize_many with each number of processes
+
+  The time includes starting the pool, as for a single call to tokenize_many.
+
+  Args:
+    wdict: the dictionary to match terms against
+    sentences: the texts to tokenize
+    processes: the numbers of worker processes to try
+  Returns:
+    A dictionary of results keyed by number of processes, with the speedup
+    relative to the first number of processes
+  """
+  num_chars = sum(len(sentence) for sentence in sentences)
+  results = {}
+  base = None
+  for n in processes:
+    start = time.perf_counter()
+    tokenized = cndict.tokenize_many(wdict, sentences, n)
+    elapsed = time.perf_counter() - start
+    if base is None:
+      base = elapsed
+    results[str(n)] = {
+      'seconds': elapsed,
+      'chars_per_sec': num_chars / elapsed if elapsed else 0.0,
+      'tokens': sum(len(tokens) for tokens in tokenized),
+      'speedup': base / elapsed if elapsed else 0.0,
+    }
+  return results
+
+
+def load_corpus(dirs: List[str]) -> List[str]:
+  """Reads the text files under the given directories and splits them into
+  sentences
+  """
+  sentences = []
+  for dname in dirs:
+    for fname in sorted(Path(dname).glob('**/*.txt')):
+      text = fname.read_text(encoding='utf-8')
+      sentences.extend(cndict.split_sentences(text))
+  return sentences
+
+
+def load_dictionary(fname: str = None) -> Mapping[str, DictionaryEntry]:
+  """Opens the given dictionary file or else the Chinese Notes dictionary"""
+  if not fname:
+    cn_home = 'https://github.com/alexamies/chinesenotes.com'
+    fname = f'{cn_home}/blob/master/data/words.txt?raw=true'
+    if 'CNREADER_HOME' in os.environ:
+      cn_home = os.environ['CNREADER_HOME']
+      fname = f'{cn_home}/data/words.txt'
+  return cndict.open_dictionary(fname)
+
+
+def percentile(values: List[float], p: float) -> float:
+  """The p-th percentile of the values, using the nearest rank
+
+  The nearest rank is the smallest value with at least p percent of the values
+  at or below it. Zero is returned if there are no values.
+  """
+  if not values:
+    return 0.0
+  ordered = sorted(values)
+  rank = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+  return ordered[rank]
+
+
+def run(wdict: Mapping[str, DictionaryEntry],
+        corpus_dirs: List[str],
+        synthetic_chars: int,
+        segmenters: List[str] = None,
+        processes: List[int] = None) -> dict:
+  """Runs the benchmarks for each tokenizer and input set
+
+  Args:
+    wdict: the dictionary to match terms against
+    corpus_dirs: directories with the corpus text files
+    synthetic_chars: the approximate size of the synthetic input
+    segmenters: names of the tokenizers in SEGMENTERS to run, all if not given
+    processes: numbers of processes to run tokenize_many with over all of the
+      inputs, skipped if not given
+  Returns:
+    A dictionary of results, keyed by input set and then tokenizer
+  """
+  inputs = {}
+  for dname in corpus_dirs:
+    inputs[dname] = load_corpus([dname])
+  if synthetic_chars > 0:
+    inputs['synthetic'] = synthetic_sentences(wdict, synthetic_chars)
+  names = segmenters or list(SEGMENTERS)
+  results = {}
+  for input_name, sentences in inputs.items():
+    results[input_name] = {}
+    for name in names:
+      logging.info(f'Benchmarking {name} on {input_name}')
+      segmenter = SEGMENTERS[name](wdict)
+      results[input_name][name] = benchmark_segmenter(segmenter, sentences)
+  benchmarks = {
+    'python': platform.python_version(),
+    'cpu_count': os.cpu_count(),
+    'dictionary_size': len(wdict),
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'results': results,
+  }
+  if processes:
+    all_sentences = [sentence for sentences in inputs.values()
+                     for sentence in sentences]
+    logging.info(f'Benchmarking tokenize_many with {processes} processes')
+    benchmarks['tokenize_many'] = benchmark_processes(wdict, all_sentences,
+                                                      processes)
+  return benchmarks
+
+
+def synthetic_sentences(wdict: Mapping[str, DictionaryEntry],
+                        num_chars: int,
+                        seed: int = 0) -> List[str]:
+  """Builds sentences of random dictionary terms totalling about num_chars
+
+  The same seed gives the same sentences for a given dictionary.
+  """
+  rand = random.Random(seed)
+  keys = sorted(wdict)
+  if not keys:
+    return []
+  sentences = []
+  total = 0
+  while total < num_chars:
+    terms = [rand.choice(keys) for _ in range(rand.randint(2, 12))]
+    sentence = ''.join(terms) + rand.choice('。，；')
+    sentences.append(sentence)
+    total += len(sentence)
+  return sentences
+
+
+def _stream_segmenter(wdict: Mapping[str, DictionaryEntry]
+                      ) -> Callable[[str], List[str]]:
+  """Wraps tokenize_stream, finding the longest term length only once"""
+  max_len = max((len(key) for key in wdict), default=1)
+  return lambda chunk: list(cndict.tokenize_stream(wdict, [chunk], max_len))
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--dict_file',
+                      dest='dict_file',
+                      help='Dictionary file to load, if not Chinese Notes')
+  parser.add_argument('--corpus_dirs',
+                      dest='corpus_dirs',
+                      nargs='*',
+                      default=CORPUS_DIRS_DEF,
+                      help='Directories with corpus text files')
+  parser.add_argument('--synthetic_chars',
+                      dest='synthetic_chars',
+                      type=int,
+                      default=SYNTHETIC_CHARS_DEF,
+                      help='Size of synthetic input, zero to skip')
+  parser.add_argument('--segmenters',
+                      dest='segmenters',
+                      nargs='*',
+                      choices=list(SEGMENTERS),
+                      help='Tokenizers to benchmark, default all')
+  parser.add_argument('--processes',
+                      dest='processes',
+                      type=int,
+                      nargs='*',
+                      default=PROCESSES_DEF,
+                      help='Numbers of processes to run tokenize_many with, '
+                           'none to skip')
+  parser.add_argument('--outfile',
+                      dest='outfile',
+                      default=OUTFILE_DEF,
+                      help='File name to write JSON results to')
+  args = parser.parse_args()
+  wdict = load_dictionary(args.dict_file)
+  results = run(wdict, args.corpus_dirs, args.synthetic_chars, args.segmenters,
+                args.processes)
+  with open(args.outfile, 'w', encoding='utf-8') as f:
+    json.dump(results, f, ensure_ascii=False, indent=2)
+  logging.info(f'Benchmark results written to {args.outfile}')
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""A BK-tree over dictionary keys for Levenshtein distance queries
+
+Each child of a node is labeled with its edit distance from the node. By the
+triangle inequality, a word at distance d from a query can only be below the
+child labeled e if |d - e| is no more than the search radius, so most of the
+tree is not visited.
+
+Edit distances are computed with the bit-parallel algorithm of Myers, in the
+form given by Hyyrö, with one bit per character of the query. Python integers
+have unlimited precision, so queries of any length fit in a single bit vector.
+
+References:
+1. Burkhard, W and Keller, R 1973, Some Approaches to Best-Match File
+   Searching, Communications of the ACM, 16(4), pp. 230-236.
+2. Myers, G 1999, A Fast Bit-Vector Algorithm for Approximate String Matching
+   Based on Dynamic Programming, Journal of the ACM, 46(3), pp. 395-415.
+3. Hyyrö, H 2001, Explaining and Extending the Bit-parallel Approximate String
+   Matching Algorithm of Myers, Technical report A-2001-10, University of
+   Tampere.
+
+Example use:
+
+tree = BKTree()
+tree.build(['中国', '中国人', '美国', '国家'])
+print(tree.find_within('中國', 1))
+
+Output:
+[('中国', 1)]
+"""
+
+import argparse
+import heapq
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from chinesenotes import cndict
+
+OUTFILE_DEF = 'data/words_bktree.tsv'
+RADIUS_DEF = 1
+
+
+def edit_distance(w1: str, w2: str) -> int:
+  """The Levenshtein distance between two strings
+
+  Insertions, deletions and substitutions of a character each cost one.
+  """
+  return _distance(_match_vectors(w1), len(w1), w2)
+
+
+def _match_vectors(pattern: str) -> Dict[str, int]:
+  """The bit vector of the positions of each character in the pattern"""
+  peq = {}
+  for i, c in enumerate(pattern):
+    peq[c] = peq.get(c, 0) | (1 << i)
+  return peq
+
+
+def _distance(peq: Dict[str, int], m: int, text: str) -> int:
+  """The edit distance of the text from the pattern with the given vectors
+
+  The vertical deltas of the last column of the dynamic programming matrix
+  are held as bit vectors of positive and negative changes, and the distance
+  is tracked in the last row.
+  """
+  if m == 0:
+    return len(text)
+  mask = (1 << m) - 1
+  last = 1 << (m - 1)
+  pv = mask
+  mv = 0
+  score = m
+  for c in text:
+    eq = peq.get(c, 0)
+    xv = eq | mv
+    xh = (((eq & pv) + pv) ^ pv) | eq
+    ph = (mv | ~(xh | pv)) & mask
+    mh = pv & xh
+    if ph & last:
+      score += 1
+    elif mh & last:
+      score -= 1
+    # The first row of the matrix increases by one in each column
+    ph = (ph << 1) | 1
+    mh <<= 1
+    pv = (mh | ~(xv | ph)) & mask
+    mv = ph & xv
+  return score
+
+
+class BKTree:
+  """Finds the dictionary keys within an edit distance of a query"""
+
+  def __init__(self):
+    """Constructor, for an empty tree"""
+    self._words: List[str] = []
+    # Children of each node keyed by their distance from it
+    self._children: List[Dict[int, int]] = []
+    self._parents: List[Tuple[int, int]] = []
+
+  def add(self, word: str):
+    """Adds a word, if it is not already in the tree"""
+    if not self._words:
+      self._add_node(word, -1, 0)
+      return
+    # The distance is symmetric, so the vectors of the word are reused at each
+    # node on the path
+    peq = _match_vectors(word)
+    m = len(word)
+    node = 0
+    while True:
+      d = _distance(peq, m, self._words[node])
+      if d == 0:
+        return
+      child = self._children[node].get(d)
+      if child is None:
+        self._add_node(word, node, d)
+        return
+      node = child
+
+  def build(self, words: Iterable[str]):
+    """Adds all of the words, in the given order"""
+    for word in words:
+      self.add(word)
+
+  def find_nearest(self, query: str, k: int) -> List[Tuple[str, int]]:
+    """Finds the k words closest to the query
+
+    Params:
+      query: the string to match
+      k: the number of words to return
+    Return: (word, distance) pairs, closest first and then in lexicographic
+      order
+    """
+    return self.search_nearest(query, k)[0]
+
+  def find_within(self, query: str, radius: int) -> List[Tuple[str, int]]:
+    """Finds the words within the given edit distance of the query
+
+    Params:
+      query: the string to match
+      radius: the maximum edit distance
+    Return: (word, distance) pairs, closest first and then in lexicographic
+      order
+    """
+    return self.search_within(query, radius)[0]
+
+  @classmethod
+  def load(cls, fname: str) -> 'BKTree':
+    """Loads a tree saved with save
+
+    Params:
+      fname: The file to read
+    Return: the tree
+    """
+    tree = cls()
+    with open(fname, 'r', encoding='utf-8') as f:
+      for line in f:
+        word, parent, d = line.rstrip('\n').split('\t')
+        tree._add_node(word, int(parent), int(d))
+    return tree
+
+  def save(self, fname: str):
+    """Saves the tree as tab separated word, parent node and distance
+
+    Parents come before their children, so the tree is rebuilt without
+    computing any distances.
+
+    Params:
+      fname: The file to write to
+    """
+    with open(fname, 'w', encoding='utf-8') as f:
+      for word, (parent, d) in zip(self._words, self._parents):
+        f.write(f'{word}\t{parent}\t{d}\n')
+
+  def search_nearest(self, query: str,
+                     k: int) -> Tuple[List[Tuple[str, int]], int]:
+    """Best first search for the k nearest words, see find_nearest
+
+    Subtrees are visited in order of the lower bound on the distance of their
+    words from the triangle inequality, and skipped once the bound exceeds the
+    distance of the kth nearest word found.
+
+    Params:
+      query: the string to match
+      k: the number of words to return
+    Return: the (word, distance) pairs, as from find_nearest, and the number
+      of nodes visited, each costing one edit distance
+    """
+    if not self._words or k <= 0:
+      return [], 0
+    peq = _match_vectors(query)
+    m = len(query)
+    # Heap of the nearest words with the farthest, then lexicographically last
+    # at the top, as (-distance, negated code points, word). The code points
+    # end with 1 so that a word ranks before its extensions.
+    nearest = []
+    queue = [(0, 0)]
+    visited = 0
+    while queue:
+      bound, node = heapq.heappop(queue)
+      if len(nearest) == k and bound > -nearest[0][0]:
+        break
+      visited += 1
+      word = self._words[node]
+      d = _distance(peq, m, word)
+      entry = (-d, [-ord(c) for c in word] + [1], word)
+      if len(nearest) < k:
+        heapq.heappush(nearest, entry)
+      elif entry > nearest[0]:
+        heapq.heapreplace(nearest, entry)
+      for e, child in self._children[node].items():
+        heapq.heappush(queue, (max(bound, abs(d - e)), child))
+    results = [(word, -neg_d) for neg_d, _, word in nearest]
+    results.sort(key=lambda result: (result[1], result[0]))
+    return results, visited
+
+  def search_within(self, query: str,
+                    radius: int) -> Tuple[List[Tuple[str, int]], int]:
+    """Finds the words within the radius, see find_within
+
+    Params:
+      query: the string to match
+      radius: the maximum edit distance
+    Return: the (word, distance) pairs, as from find_within, and the number of
+      nodes visited, each costing one edit distance
+    """
+    if not self._words:
+      return [], 0
+    peq = _match_vectors(query)
+    m = len(query)
+    results = []
+    stack = [0]
+    visited = 0
+    while stack:
+      node = stack.pop()
+      visited += 1
+      d = _distance(peq, m, self._words[node])
+      if d <= radius:
+        results.append((self._words[node], d))
+      for e, child in self._children[node].items():
+        if d - radius <= e <= d + radius:
+          stack.append(child)
+    results.sort(key=lambda result: (result[1], result[0]))
+    return results, visited
+
+  def _add_node(self, word: str, parent: int, d: int):
+    """Adds a node below the parent, or the root if parent is -1"""
+    node = len(self._words)
+    self._words.append(word)
+    self._children.append({})
+    self._parents.append((parent, d))
+    if parent >= 0:
+      self._children[parent][d] = node
+
+  def __len__(self) -> int:
+    return len(self._words)
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--dict_file',
+                      dest='dict_file',
+                      help='Dictionary file to load, if not Chinese Notes')
+  parser.add_argument('--tree_file',
+                      dest='tree_file',
+                      default=OUTFILE_DEF,
+                      help='File to load the tree from or save it to')
+  parser.add_argument('--query',
+                      dest='query',
+                      help='Word to find the nearest keys to')
+  parser.add_argument('--radius',
+                      dest='radius',
+                      type=int,
+                      default=RADIUS_DEF,
+                      help='Maximum edit distance for the query')
+  parser.add_argument('--k',
+                      dest='k',
+                      type=int,
+                      help='Number of nearest keys, instead of a radius')
+  args = parser.parse_args()
+  if not args.query:
+    wdict = cndict.open_dictionary(args.dict_file)
+    tree = BKTree()
+    tree.build(wdict)
+    tree.save(args.tree_file)
+    logging.info(f'Saved tree of {len(tree)} keys to {args.tree_file}')
+    return
+  tree = BKTree.load(args.tree_file)
+  if args.k:
+    results = tree.find_nearest(args.query, args.k)
+  else:
+    results = tree.find_within(args.query, args.radius)
+  for word, d in results:
+    print(f'{word}\t{d}')
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""A bounded least recently used (LRU) cache with hit and miss counters
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+  """A bounded cache that evicts the least recently used entry when full
+
+  Example use:
+
+  cache = LRUCache(2)
+  cache.put('a', 1)
+  cache.put('b', 2)
+  cache.get('a')
+  cache.put('c', 3) # evicts 'b'
+  print(cache.hits, cache.misses, cache.evictions)
+
+  Entries can also expire a given number of seconds after they are put, for
+  values that may go out of date.
+  """
+
+  def __init__(self, maxsize: int = 1024, ttl: float = None,
+               timer: Callable[[], float] = time.monotonic):
+    """Constructor
+
+    Params:
+      maxsize: The maximum number of entries to hold, must be positive
+      ttl: The number of seconds that entries are kept, forever if not given
+      timer: The clock that ttl is measured with
+    """
+    if maxsize < 1:
+      raise ValueError(f'Cache size must be positive: {maxsize}')
+    if ttl is not None and ttl <= 0:
+      raise ValueError(f'Time to live must be positive: {ttl}')
+    self._maxsize = maxsize
+    self._ttl = ttl
+    self._timer = timer
+    self._entries = OrderedDict()
+    # Expiry time of each entry, if there is a time to live
+    self._expiries = {}
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+    self._expirations = 0
+
+  def clear(self):
+    """Removes all entries, keeping the counters"""
+    self._entries.clear()
+    self._expiries.clear()
+
+  @property
+  def evictions(self) -> int:
+    """The number of entries evicted to make room for new ones"""
+    return self._evictions
+
+  @property
+  def expirations(self) -> int:
+    """The number of entries removed on lookup after their time to live"""
+    return self._expirations
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    """Gets the value for the key, marking it as recently used
+
+    Params:
+      key: The key to look up
+      default: The value to return if the key is not in the cache
+    Return: The cached value or default if not found or expired
+    """
+    if self._ttl is not None and self._expired(key):
+      del self._entries[key]
+      del self._expiries[key]
+      self._expirations += 1
+    if key in self._entries:
+      self._hits += 1
+      self._entries.move_to_end(key)
+      return self._entries[key]
+    self._misses += 1
+    return default
+
+  @property
+  def hits(self) -> int:
+    """The number of lookups that found a value"""
+    return self._hits
+
+  @property
+  def maxsize(self) -> int:
+    """The maximum number of entries held"""
+    return self._maxsize
+
+  @property
+  def misses(self) -> int:
+    """The number of lookups that did not find a value"""
+    return self._misses
+
+  def put(self, key: Hashable, value: Any):
+    """Adds or replaces the value for the key, evicting the oldest if full"""
+    self._entries[key] = value
+    self._entries.move_to_end(key)
+    if self._ttl is not None:
+      self._expiries[key] = self._timer() + self._ttl
+    if len(self._entries) > self._maxsize:
+      oldest, _ = self._entries.popitem(last=False)
+      self._expiries.pop(oldest, None)
+      self._evictions += 1
+
+  @property
+  def ttl(self) -> float:
+    """The number of seconds that entries are kept, or None if forever"""
+    return self._ttl
+
+  def _expired(self, key: Hashable) -> bool:
+    """Whether the key is in the cache but past its time to live"""
+    expiry = self._expiries.get(key)
+    return expiry is not None and self._timer() >= expiry
+
+  def __contains__(self, key: Hashable) -> bool:
+    return key in self._entries and not self._expired(key)
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __repr__(self):
+    return (f'LRUCache(size={len(self)}, maxsize={self._maxsize}, '
+            f'hits={self._hits}, misses={self._misses}, '
+            f'evictions={self._evictions}, '
+            f'expirations={self._expirations})')
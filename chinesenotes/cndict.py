@@ -23,14 +23,78 @@ Simplified and traditional words are keys.
 """
 import argparse
 import logging
+import multiprocessing
 import os
+import re
 import urllib.request
-from typing import List, Mapping, TextIO
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping, Set, TextIO, Tuple
 
+from chinesenotes.cache import LRUCache
 from chinesenotes.config import AppConfig
 from chinesenotes.config import ConfigException
 from chinesenotes.cndict_types import DictionaryEntry
 from chinesenotes.cndict_types import WordSense
+from chinesenotes.process_annotated import includes_function_word
+from chinesenotes.process_annotated import read_mutual_info
+
+CACHE_SIZE_DEF = 10000
+# Decision point for accepting two-character terms based on mutual information,
+# from training with the Blue Cliff Record data set
+MI_THRESHOLD_DEF = -0.507
+SENTENCE_DELIMITERS = '。，；\n'
+# The number of characters tokenize_stream reads at a time, as a multiple of
+# the length of the longest term
+STREAM_BLOCK_TERMS = 256
+_cjk_re = re.compile('[\u2e80-\u2fff\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff'
+                     '\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef'
+                     '\U00020000-\U0003134f]+')
+_non_cjk_token_re = re.compile(r'\S+|\s+')
+_sentence_re = re.compile(f'[^{SENTENCE_DELIMITERS}]*[{SENTENCE_DELIMITERS}]?')
+
+# Dictionary used by tokenize_many worker processes, set by _init_worker
+_worker_wdict = None
+
+
+class CachedTokenizer:
+  """Memoizes the results of tokenize_greedy for repeated chunks of text
+
+  Useful for texts that repeat the same sentences and passages many times. The
+  tokens are returned as tuples so that cached results can be shared safely
+  between callers.
+
+  Example use:
+
+  tokenizer = CachedTokenizer(wdict, maxsize=1000)
+  for chunk in split_sentences(text):
+    tokens = tokenizer.tokenize(chunk)
+  print(tokenizer.cache)
+  """
+
+  def __init__(self,
+               wdict: Mapping[str, DictionaryEntry],
+               maxsize: int = CACHE_SIZE_DEF):
+    """Constructor
+
+    Params:
+      wdict: the dictionary to match terms against
+      maxsize: the maximum number of chunks to hold results for
+    """
+    self._wdict = wdict
+    self._cache = LRUCache(maxsize)
+
+  @property
+  def cache(self) -> LRUCache:
+    """The cache, including hit, miss and eviction counters"""
+    return self._cache
+
+  def tokenize(self, chunk: str) -> Tuple[str, ...]:
+    """Tokenizes the chunk with tokenize_greedy or returns a cached result"""
+    segments = self._cache.get(chunk)
+    if segments is None:
+      segments = tuple(tokenize_greedy(self._wdict, chunk))
+      self._cache.put(chunk, segments)
+    return segments
 
 
 def lookup(wdict: Mapping[str, DictionaryEntry],
@@ -40,6 +104,40 @@ def lookup(wdict: Mapping[str, DictionaryEntry],
   return wdict[keyword]
 
 
+def load_rejected_bigrams(mi_file: str,
+                          mi_threshold: float = MI_THRESHOLD_DEF,
+                          fn_mi_threshold: float = None) -> Set[str]:
+  """Finds the two-character terms that the tokenizer filter should reject
+
+    Applies the decision tree learned by train_tokenizer.py to every term in
+    the mutual information file once, so that tokenize_filtered only needs a
+    set lookup per candidate term.
+
+    Args:
+      mi_file: file with mutual information for two-character terms, as
+        written by mutualinfo.py
+      mi_threshold: reject terms with mutual information at or below this
+      fn_mi_threshold: reject terms that include a function word with mutual
+        information at or below this, the same as mi_threshold if not given
+    Returns:
+      The set of two-character terms to reject
+  """
+  if fn_mi_threshold is None:
+    fn_mi_threshold = mi_threshold
+  rejected = set()
+  for term, value in read_mutual_info(mi_file).items():
+    if len(term) != 2:
+      continue
+    mi = float(value)
+    threshold = mi_threshold
+    if includes_function_word(term):
+      threshold = fn_mi_threshold
+    if mi <= threshold:
+      rejected.add(term)
+  logging.info(f'Loaded {len(rejected)} rejected bigrams from {mi_file}')
+  return rejected
+
+
 def open_dictionary(fname=None,
                     chinese_only=False) -> Mapping[str, DictionaryEntry]:
   """Reads the dictionary from a file or URL.
@@ -70,8 +168,26 @@ def open_dictionary(fname=None,
 
 
 def tokenize_greedy(wdict: Mapping[str, DictionaryEntry],
-                    chunk: str) -> List[str]:
-  """A greedy tokenizer"""
+                    chunk: str,
+                    skip_non_cjk: bool = False) -> List[str]:
+  """A greedy tokenizer
+
+    Set skip_non_cjk = True for text that mixes Chinese with long runs of
+    other text, such as English, numbers or markup. Runs of non-CJK characters
+    are then found with a single regular expression scan and split at
+    whitespace, and dictionary matching is only done over the CJK spans. Joining
+    the tokens gives back the original text. Dictionary terms that mix CJK and
+    other characters, such as AA制, will not be found in this mode.
+
+    Args:
+      wdict: the dictionary to match terms against
+      chunk: the text to tokenize
+      skip_non_cjk: emit non-CJK runs without looking them up in wdict
+    Returns:
+      A list of tokens
+  """
+  if skip_non_cjk:
+    return _tokenize_cjk_runs(wdict, chunk)
   segments = []
   i = 0
   while i < len(chunk):
@@ -87,6 +203,123 @@ def tokenize_greedy(wdict: Mapping[str, DictionaryEntry],
         break
   return segments
 
+def tokenize_filtered(wdict: Mapping[str, DictionaryEntry],
+                      chunk: str,
+                      rejected: Set[str]) -> List[str]:
+  """A greedy tokenizer that skips dictionary matches in a rejected set
+
+    A rejected term falls back to the next longest match, in the end to single
+    characters. Use load_rejected_bigrams to find two-character terms with low
+    mutual information.
+  """
+  segments = []
+  i = 0
+  while i < len(chunk):
+    for j in range(len(chunk), i, -1):
+      word = chunk[i:j]
+      if word in wdict and word not in rejected:
+        segments.append(word)
+        i += len(word)
+        break
+      if len(word) == 1:
+        segments.append(word)
+        i += 1
+        break
+  return segments
+
+
+def tokenize_stream(wdict: Mapping[str, DictionaryEntry],
+                    text: Iterable[str],
+                    max_len: int = None) -> Iterator[str]:
+  """A greedy tokenizer that reads text lazily and yields tokens one at a time
+
+    The text is read in blocks of STREAM_BLOCK_TERMS * max_len characters,
+    with file objects read a block at a time and longer lines split, so that a
+    file without line breaks is not read in one piece. Line breaks are removed
+    and up to max_len - 1 characters are carried over from one block to the
+    next so that terms spanning a boundary are still found. Memory is bounded
+    by the block size plus max_len, regardless of the size of the input. The
+    tokens are the same as tokenize_greedy gives for the concatenated text.
+
+    Args:
+      wdict: the dictionary to match terms against
+      text: an iterable of strings, such as a file object or a list of lines
+      max_len: the length of the longest dictionary term, computed from wdict
+        if not given
+    Returns:
+      An iterator over the tokens
+  """
+  if max_len is None:
+    max_len = max((len(key) for key in wdict), default=1)
+  max_len = max(max_len, 1)
+  buffer = ''
+  for block in _text_blocks(text, STREAM_BLOCK_TERMS * max_len):
+    buffer += block
+    i = 0
+    while len(buffer) - i >= max_len:
+      word = _longest_match(wdict, buffer, i, i + max_len)
+      yield word
+      i += len(word)
+    buffer = buffer[i:]
+  i = 0
+  while i < len(buffer):
+    word = _longest_match(wdict, buffer, i, len(buffer))
+    yield word
+    i += len(word)
+
+
+def split_sentences(chunk: str) -> List[str]:
+  """Splits text into sentence-sized pieces at Chinese punctuation and newlines
+
+    The delimiter is kept at the end of each piece so that joining the pieces
+    gives back the original text.
+  """
+  return [s for s in _sentence_re.findall(chunk) if s]
+
+
+def tokenize_many(wdict: Mapping[str, DictionaryEntry],
+                  texts: Iterable[str],
+                  processes: int = None,
+                  chunksize: int = 64) -> List[List[str]]:
+  """Tokenizes a batch of texts in parallel with a pool of processes
+
+    Each text is split into sentences with split_sentences and the sentences
+    are tokenized with tokenize_greedy. Where the platform supports it the
+    worker processes are forked so that they share the dictionary loaded in
+    the parent copy-on-write instead of each loading or unpickling a copy.
+    Terms that span a sentence delimiter are not found.
+
+    Args:
+      wdict: the dictionary to match terms against
+      texts: the texts to tokenize
+      processes: the number of worker processes, the CPU count if not given
+      chunksize: the number of sentences sent to a worker at a time
+    Returns:
+      A list of tokens for each text, in the same order as the texts
+  """
+  sentences = []
+  counts = []
+  for text in texts:
+    pieces = split_sentences(text)
+    sentences.extend(pieces)
+    counts.append(len(pieces))
+  if 'fork' in multiprocessing.get_all_start_methods():
+    context = multiprocessing.get_context('fork')
+  else:
+    context = multiprocessing.get_context()
+  with context.Pool(processes, _init_worker, (wdict,)) as pool:
+    results = pool.map(_tokenize_worker, sentences, chunksize)
+  tokenized = []
+  i = 0
+  for count in counts:
+    segments = []
+    for result in results[i:i + count]:
+      segments.extend(result)
+    tokenized.append(segments)
+    i += count
+  return tokenized
+
+
 def tokenize_exclude_whole(wdict: Mapping[str, DictionaryEntry],
                     chunk: str) -> List[str]:
   """A tokenize but not including the full word"""
@@ -106,6 +339,64 @@ def tokenize_exclude_whole(wdict: Mapping[str, DictionaryEntry],
   return segments
 
 
+def _longest_match(wdict: Mapping[str, DictionaryEntry],
+                   chunk: str,
+                   start: int,
+                   end: int) -> str:
+  """Finds the longest term in chunk[start:end] beginning at start
+
+    Returns a single character if no term is found.
+  """
+  for j in range(end, start + 1, -1):
+    word = chunk[start:j]
+    if word in wdict:
+      return word
+  return chunk[start]
+
+
+def _text_blocks(text: Iterable[str], size: int) -> Iterator[str]:
+  """Splits text into blocks of at most size characters without line breaks
+
+    A file object is read size characters at a time instead of a line at a
+    time.
+  """
+  if hasattr(text, 'read'):
+    for block in iter(lambda: text.read(size), ''):
+      yield block.replace('\r', '').replace('\n', '')
+    return
+  for line in text:
+    line = line.rstrip('\r\n')
+    for start in range(0, len(line), size):
+      yield line[start:start + size]
+
+
+def _init_worker(wdict: Mapping[str, DictionaryEntry]):
+  """Initializes a tokenize_many worker process with the dictionary"""
+  global _worker_wdict
+  _worker_wdict = wdict
+
+
+def _tokenize_worker(chunk: str) -> List[str]:
+  """Tokenizes a chunk of text in a tokenize_many worker process"""
+  return tokenize_greedy(_worker_wdict, chunk)
+
+
+def _tokenize_cjk_runs(wdict: Mapping[str, DictionaryEntry],
+                       chunk: str) -> List[str]:
+  """Tokenizes CJK spans with the dictionary and splits the rest at whitespace
+  """
+  segments = []
+  i = 0
+  for match in _cjk_re.finditer(chunk):
+    if match.start() > i:
+      segments.extend(_non_cjk_token_re.findall(chunk, i, match.start()))
+    segments.extend(tokenize_greedy(wdict, match.group()))
+    i = match.end()
+  if i < len(chunk):
+    segments.extend(_non_cjk_token_re.findall(chunk, i))
+  return segments
+
+
 def _load_dictionary(dict_file: TextIO,
                      chinese_only=False) -> Mapping[str, DictionaryEntry]:
   """Loads the dictionary from a file or URL.
@@ -231,6 +522,29 @@ def main():
   parser.add_argument('--tokenize',
                       dest='tokenize',
                       help='Segment the text into multi-character terms')
+  parser.add_argument('--mi_file',
+                      dest='mi_file',
+                      help='Mutual information file to filter two-character '
+                           'terms with --tokenize')
+  parser.add_argument('--mi_threshold',
+                      dest='mi_threshold',
+                      type=float,
+                      default=MI_THRESHOLD_DEF,
+                      help='Reject two-character terms with mutual information '
+                           'at or below this')
+  parser.add_argument('--fn_mi_threshold',
+                      dest='fn_mi_threshold',
+                      type=float,
+                      help='Threshold for terms that include a function word')
+  parser.add_argument('--tokenize_dir',
+                      dest='tokenize_dir',
+                      help='Segment all the .txt files under a directory, '
+                           'printing one line per file with the tokens '
+                           'separated by spaces')
+  parser.add_argument('--processes',
+                      dest='processes',
+                      type=int,
+                      help='Number of processes to use with --tokenize_dir')
   args = parser.parse_args()
   if args.lookup:
     entry = lookup(wdict, args.lookup)
@@ -239,10 +553,25 @@ def main():
       print(f'entry has no word senses: {entry}')
     english = senses[0].english
     print(f'English: {english}')
+  elif args.tokenize and args.mi_file:
+    logging.info('Filtered dictionary-based text segmentation')
+    rejected = load_rejected_bigrams(args.mi_file, args.mi_threshold,
+                                     args.fn_mi_threshold)
+    segments = tokenize_filtered(wdict, args.tokenize, rejected)
+    print(f'Segments: {segments}')
   elif args.tokenize:
     logging.info('Greedy dictionary-based text segmentation')
     segments = tokenize_greedy(wdict, args.tokenize)
     print(f'Segments: {segments}')
+  elif args.tokenize_dir:
+    fnames = sorted(Path(args.tokenize_dir).glob('**/*.txt'))
+    texts = [fname.read_text(encoding='utf-8') for fname in fnames]
+    logging.info(f'Tokenizing {len(texts)} files in {args.tokenize_dir}')
+    results = tokenize_many(wdict, texts, args.processes)
+    for fname, segments in zip(fnames, results):
+      tokens = [segment for segment in segments if not segment.isspace()]
+      logging.info(f'{fname}: {len(tokens)} tokens')
+      print(f'{fname}\t{" ".join(tokens)}')
 
 # Entry point from a script
 if __name__ == '__main__':
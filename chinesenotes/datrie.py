@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""A compact double-array trie that can be saved to a file and memory mapped
+
+The trie is held in flat integer arrays, a few bytes per node, instead of
+State and Transition objects. Keys are stored as UTF-8 bytes, so that the
+children of a node span at most 256 slots however large the character set is,
+which keeps the arrays dense. The transition from node s on a byte with code c
+(the byte value plus one) goes to node t = base[s] + c, and is valid if
+check[t] == s. Each node also records the code of its first child and of its
+next sibling, so that prefix enumeration only visits existing edges.
+
+Saved files are loaded with mmap without copying the arrays, so that many
+processes can share one copy of the trie in the page cache.
+
+References:
+1. Aoe, J 1989, An Efficient Digital Search Algorithm by Using a Double-Array
+   Structure, IEEE Transactions on Software Engineering, 15(9), pp. 1066-1077.
+2. Crochemore, M, Hancart, C, and Lecroq, T, 2007, Algorithms on Strings,
+   Cambridge University Press, e-book.
+
+Example use:
+
+datrie = DoubleArrayTrie()
+datrie.build(['zha', 'zhang', 'zhan', 'zhao', 'fang'])
+datrie.save('keys.da')
+datrie = DoubleArrayTrie()
+datrie.load('keys.da')
+print(datrie.find_with_prefix('zh'))
+
+Output:
+['zha', 'zhan', 'zhang', 'zhao']
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from collections import deque
+from typing import Iterable, List
+
+MAGIC = b'CNDA'
+VERSION = 1
+# Magic, version, little endian flag, number of keys, array size. The header is
+# followed by the base, check, child and sibling int arrays and the terminal
+# byte array.
+_HEADER = struct.Struct('<4sIIII')
+_ROOT = 1
+# Number of free slots to try when placing the children of a node
+_MAX_TRIES = 256
+
+
+class DoubleArrayException(Exception):
+  """Exception thrown if a double-array trie file cannot be loaded"""
+
+
+class DoubleArrayTrie:
+  """Recognizes a set of words with a double-array trie"""
+
+  def __init__(self):
+    """Constructor, for an empty trie"""
+    self._base = array('i', [0, 0])
+    self._check = array('i', [0, 0])
+    self._child = array('i', [0, 0])
+    self._sibling = array('i', [0, 0])
+    self._terminal = array('B', [0, 0])
+    self._num_keys = 0
+    self._mmap = None
+    self._view = None
+
+  def build(self, keys: Iterable[str]):
+    """Builds the trie from the keys, replacing any previous contents
+
+    Params:
+      keys: The dictionary keys, in any order
+    """
+    self.close()
+    words = sorted({key.encode('utf-8') for key in keys})
+    base = array('i', [0, 0])
+    check = array('i', [0, 0])
+    child = array('i', [0, 0])
+    sibling = array('i', [0, 0])
+    terminal = array('B', [0, 0])
+    used = bytearray([1, 1])
+    # Doubly linked list of free slots, with slot 0 as the head of the list
+    next_free = [0, 0]
+    prev_free = [0, 0]
+
+    def grow(new_size: int):
+      """Extends the arrays, adding the new slots to the free list"""
+      old_size = len(used)
+      if new_size <= old_size:
+        return
+      new_size = max(new_size, old_size * 2)
+      extra = new_size - old_size
+      for arr in (base, check, child, sibling):
+        arr.extend(array('i', [0]) * extra)
+      terminal.extend(array('B', [0]) * extra)
+      used.extend(bytearray(extra))
+      tail = prev_free[0]
+      next_free.extend(range(old_size + 1, new_size + 1))
+      next_free[-1] = 0
+      prev_free.extend(range(old_size - 1, new_size - 1))
+      prev_free[old_size] = tail
+      next_free[tail] = old_size
+      prev_free[0] = new_size - 1
+
+    top = _ROOT + 1 # One past the highest slot in use
+    if words and words[0] == b'':
+      terminal[_ROOT] = 1
+    # Each item is a node, the depth of the node, and the range of words below
+    queue = deque([(_ROOT, 0, 0, len(words))])
+    while queue:
+      node, depth, lo, hi = queue.popleft()
+      groups = [] # Code and range of words for each child
+      i = lo
+      while i < hi:
+        if len(words[i]) <= depth:
+          i += 1
+          continue
+        byte = words[i][depth]
+        j = i + 1
+        while j < hi and words[j][depth] == byte:
+          j += 1
+        groups.append((byte + 1, i, j))
+        i = j
+      if not groups:
+        continue
+      # Find a base that puts every child in a free slot, trying a bounded
+      # number of free slots before falling back to the end of the arrays
+      first = groups[0][0]
+      last = groups[-1][0]
+      pos = next_free[0]
+      tries = 0
+      while True:
+        if pos == 0 or tries >= _MAX_TRIES:
+          b = max(top - first, 1)
+          grow(b + last + 1)
+          break
+        b = pos - first
+        if b >= 1:
+          grow(b + last + 1)
+          if all(not used[b + code] for code, _, _ in groups):
+            break
+        pos = next_free[pos]
+        tries += 1
+      base[node] = b
+      child[node] = first
+      for k, (code, i, j) in enumerate(groups):
+        t = b + code
+        used[t] = 1
+        top = max(top, t + 1)
+        next_free[prev_free[t]] = next_free[t]
+        prev_free[next_free[t]] = prev_free[t]
+        check[t] = node
+        if k + 1 < len(groups):
+          sibling[t] = groups[k + 1][0]
+        if len(words[i]) == depth + 1:
+          terminal[t] = 1
+        queue.append((t, depth + 1, i, j))
+    self._base = base[:top]
+    self._check = check[:top]
+    self._child = child[:top]
+    self._sibling = sibling[:top]
+    self._terminal = terminal[:top]
+    self._num_keys = len(words)
+
+  def close(self):
+    """Releases the memory mapped file, if the trie was loaded from one"""
+    if self._mmap is not None:
+      for arr in (self._base, self._check, self._child, self._sibling,
+                  self._terminal):
+        arr.release()
+      self._view.release()
+      self._mmap.close()
+      self.__init__()
+
+  def contains(self, key: str) -> bool:
+    """Tests whether the key is in the trie"""
+    node = self._walk(key.encode('utf-8'))
+    return node > 0 and self._terminal[node] == 1
+
+  def find_with_prefix(self, prefix: str, limit: int = None) -> List[str]:
+    """Finds the keys with the given prefix, in lexicographic order
+
+    Params:
+      prefix: the prefix to complete
+      limit: the maximum number of keys to return, all if not given
+    Return: the keys with the given prefix
+    """
+    prefix_bytes = prefix.encode('utf-8')
+    node = self._walk(prefix_bytes)
+    terms = []
+    if node <= 0:
+      return terms
+    base = self._base
+    child = self._child
+    sibling = self._sibling
+    terminal = self._terminal
+    stack = [(node, prefix_bytes)]
+    while stack:
+      node, term = stack.pop()
+      if terminal[node]:
+        terms.append(term.decode('utf-8'))
+        if limit is not None and len(terms) >= limit:
+          break
+      children = []
+      code = child[node]
+      while code:
+        t = base[node] + code
+        children.append((t, term + bytes((code - 1,))))
+        code = sibling[t]
+      children.reverse()
+      stack.extend(children)
+    return terms
+
+  def load(self, fname: str):
+    """Memory maps a trie saved with save, without copying the arrays
+
+    Params:
+      fname: the file name to load
+    Raises: DoubleArrayException if the file is not a valid trie file
+    """
+    self.close()
+    with open(fname, 'rb') as f:
+      mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    int_size = array('i').itemsize
+    error = None
+    if len(view) < _HEADER.size:
+      error = f'Not a double-array trie file: {fname}'
+    else:
+      magic, version, little, num_keys, size = _HEADER.unpack_from(view)
+      if magic != MAGIC or version != VERSION:
+        error = f'Not a double-array trie file: {fname}'
+      elif bool(little) != (sys.byteorder == 'little'):
+        error = f'File {fname} has a different byte order'
+      elif len(view) != _HEADER.size + size * (4 * int_size + 1):
+        error = f'File {fname} is truncated'
+    if error:
+      view.release()
+      mapped.close()
+      raise DoubleArrayException(error)
+    offset = _HEADER.size
+    arrays = []
+    for _ in range(4):
+      end = offset + size * int_size
+      arrays.append(view[offset:end].cast('i'))
+      offset = end
+    arrays.append(view[offset:offset + size].cast('B'))
+    (self._base, self._check, self._child, self._sibling,
+     self._terminal) = arrays
+    self._num_keys = num_keys
+    self._mmap = mapped
+    self._view = view
+
+  def longest_prefix(self, text: str, start: int = 0) -> int:
+    """Finds the longest key that is a prefix of text[start:]
+
+    Params:
+      text: the text to match
+      start: the position in the text to start matching from
+    Return: the length in characters of the longest matching key, 0 if there
+      is none
+    """
+    base = self._base
+    check = self._check
+    terminal = self._terminal
+    size = len(check)
+    node = _ROOT
+    longest = 0
+    for i in range(start, len(text)):
+      for byte in text[i].encode('utf-8'):
+        t = base[node] + byte + 1
+        if t >= size or check[t] != node:
+          return longest
+        node = t
+      if terminal[node]:
+        longest = i - start + 1
+    return longest
+
+  def save(self, fname: str):
+    """Saves the trie to a single file that can be memory mapped with load"""
+    with open(fname, 'wb') as f:
+      f.write(_HEADER.pack(MAGIC, VERSION, int(sys.byteorder == 'little'),
+                           self._num_keys, len(self._base)))
+      for arr in (self._base, self._check, self._child, self._sibling,
+                  self._terminal):
+        f.write(arr)
+
+  @property
+  def size(self) -> int:
+    """The length of the base and check arrays"""
+    return len(self._base)
+
+  def _walk(self, prefix: bytes) -> int:
+    """Follows the prefix from the root, returning the node or -1"""
+    base = self._base
+    check = self._check
+    size = len(check)
+    node = _ROOT
+    for byte in prefix:
+      t = base[node] + byte + 1
+      if t >= size or check[t] != node:
+        return -1
+      node = t
+    return node
+
+  def __contains__(self, key: str) -> bool:
+    return self.contains(key)
+
+  def __len__(self) -> int:
+    return self._num_keys
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""A minimal acyclic automaton (DAWG) for a set of dictionary keys
+
+Unlike a trie, which shares only prefixes, the minimal automaton also shares
+suffixes, for example the many place names ending in 县 or 縣, so it has far
+fewer states for a large dictionary. The automaton is built incrementally from
+keys in lexicographic order, so that only the states on the path of the
+previous key need to be minimized before each new key is added.
+
+References:
+1. Daciuk, J, Mihov, S, Watson, B, and Watson, R 2000, Incremental
+   Construction of Minimal Acyclic Finite-State Automata, Computational
+   Linguistics, 26(1), pp. 3-16.
+2. Crochemore, M, Hancart, C, and Lecroq, T, 2007, Algorithms on Strings,
+   Cambridge University Press, e-book.
+
+Example use:
+
+dawg = Dawg()
+dawg.build(['zha', 'zhang', 'zhan', 'zhao', 'fang'])
+print(dawg.find_with_prefix('zh'))
+
+Output:
+['zha', 'zhan', 'zhang', 'zhao']
+"""
+
+from typing import Dict, Iterable, List, Tuple, Union
+
+
+class DawgException(Exception):
+  """Exception thrown if keys are not added in lexicographic order"""
+
+
+class _Node:
+  """A state of the automaton"""
+
+  __slots__ = ('id', 'final', 'edges')
+
+  def __init__(self, node_id: int):
+    self.id = node_id
+    self.final = False
+    self.edges: Dict[str, '_Node'] = {}
+
+  def signature(self) -> Tuple:
+    """Identifies the node by its right language, given minimized children"""
+    return (self.final,
+            tuple((symbol, node.id) for symbol, node in self.edges.items()))
+
+
+class Dawg:
+  """Recognizes a set of words with a minimal acyclic automaton"""
+
+  def __init__(self):
+    """Constructor, for an empty automaton"""
+    self._next_id = 0
+    self._root = self._new_node()
+    self._previous = ''
+    self._num_keys = 0
+    # Edges on the path of the previous key that are not yet minimized, as
+    # (parent, symbol, child)
+    self._unchecked: List[Tuple[_Node, str, _Node]] = []
+    # Minimized nodes keyed by signature
+    self._register: Dict[Tuple, _Node] = {}
+
+  def add(self, key: str):
+    """Adds a key, which must follow the previous key in lexicographic order
+
+    Params:
+      key: The dictionary key to add
+    Raises: DawgException if the key is out of order
+    """
+    if self._num_keys > 0 and key <= self._previous:
+      if key == self._previous:
+        return
+      raise DawgException(f'Key {key} added after {self._previous}')
+    common = 0
+    for a, b in zip(key, self._previous):
+      if a != b:
+        break
+      common += 1
+    self._minimize(common)
+    node = self._unchecked[-1][2] if self._unchecked else self._root
+    for symbol in key[common:]:
+      next_node = self._new_node()
+      node.edges[symbol] = next_node
+      self._unchecked.append((node, symbol, next_node))
+      node = next_node
+    node.final = True
+    self._previous = key
+    self._num_keys += 1
+
+  def build(self, keys: Iterable[str]):
+    """Builds the automaton from the keys, replacing any previous contents
+
+    Params:
+      keys: The dictionary keys, in any order
+    """
+    self.__init__()
+    for key in sorted(set(keys)):
+      self.add(key)
+    self.finish()
+
+  def contains(self, key: str) -> bool:
+    """Tests whether the key is in the automaton"""
+    node = self._walk(key)
+    return node is not None and node.final
+
+  def find_with_prefix(self, prefix: str, limit: int = None) -> List[str]:
+    """Finds the keys with the given prefix, in lexicographic order
+
+    Params:
+      prefix: the prefix to complete
+      limit: the maximum number of keys to return, all if not given
+    Return: the keys with the given prefix
+    """
+    node = self._walk(prefix)
+    terms = []
+    if node is None:
+      return terms
+    stack = [(node, prefix)]
+    while stack:
+      node, term = stack.pop()
+      if node.final:
+        terms.append(term)
+        if limit is not None and len(terms) >= limit:
+          break
+      for symbol in sorted(node.edges, reverse=True):
+        stack.append((node.edges[symbol], term + symbol))
+    return terms
+
+  def finish(self):
+    """Minimizes the path of the last key, after which no keys can be added
+
+    The register used during construction is released to save memory.
+    """
+    self._minimize(0)
+    self._register = {}
+
+  @property
+  def num_edges(self) -> int:
+    """The number of transitions in the automaton"""
+    return sum(len(node.edges) for node in self._nodes().values())
+
+  @property
+  def num_nodes(self) -> int:
+    """The number of states in the automaton"""
+    return len(self._nodes())
+
+  def _minimize(self, down_to: int):
+    """Replaces unchecked nodes below down_to with equivalent registered ones
+    """
+    while len(self._unchecked) > down_to:
+      parent, symbol, child = self._unchecked.pop()
+      signature = child.signature()
+      registered = self._register.get(signature)
+      if registered is not None:
+        parent.edges[symbol] = registered
+      else:
+        self._register[signature] = child
+
+  def _new_node(self) -> _Node:
+    """Creates a node with a unique id"""
+    node = _Node(self._next_id)
+    self._next_id += 1
+    return node
+
+  def _nodes(self) -> Dict[int, _Node]:
+    """The distinct nodes reachable from the root, keyed by id"""
+    nodes = {self._root.id: self._root}
+    stack = [self._root]
+    while stack:
+      node = stack.pop()
+      for next_node in node.edges.values():
+        if next_node.id not in nodes:
+          nodes[next_node.id] = next_node
+          stack.append(next_node)
+    return nodes
+
+  def _walk(self, prefix: str) -> Union[_Node, None]:
+    """Follows the prefix from the root, returning the node or None"""
+    node = self._root
+    for symbol in prefix:
+      node = node.edges.get(symbol)
+      if node is None:
+        return None
+    return node
+
+  def __contains__(self, key: str) -> bool:
+    return self.contains(key)
+
+  def __len__(self) -> int:
+    return self._num_keys
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Approximate phrase similarity with MinHash signatures and locality sensitive
+hashing (LSH).
+
+Each phrase is represented by its set of character n-grams, bigrams by
+default, or by the whole phrase if it is shorter than n. The MinHash signature
+of a set holds the minimum of each of a number of random hash functions over
+its members. Two sets agree at any one position with probability equal to
+their Jaccard similarity. The signature is cut into bands of rows, and
+phrases whose signatures agree in all rows of any band fall in the same
+bucket. A query is compared only with the phrases sharing a bucket with it.
+Phrases with Jaccard similarity s are found with probability
+1 - (1 - s^rows)^bands, so more rows make the index more selective and more
+bands raise recall.
+
+References:
+1. Leskovec, J, Rajaraman, A, and Ullman, J 2020, Mining of Massive Datasets,
+   3rd edition, Cambridge University Press, chapter 3.
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+import zlib
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from chinesenotes import benchmark
+from chinesenotes import similarity
+
+BANDS_DEF = 16
+ROWS_DEF = 4
+NGRAM_DEF = 2
+TOP_K_DEF = 10
+NUM_QUERIES_DEF = 100
+CORPUS_DIRS_DEF = benchmark.CORPUS_DIRS_DEF
+OUTFILE_DEF = 'minhash_recall.json'
+
+# Mersenne prime modulus of the hash functions, small enough that products of
+# 31 bit values fit in 64 bits
+_PRIME = (1 << 31) - 1
+# Number of phrases hashed at a time, to bound the size of temporary arrays
+_CHUNK = 4096
+
+
+def shingles(text: str, n: int = NGRAM_DEF) -> Set[str]:
+  """The character n-grams of the text, or the text if it is shorter than n"""
+  if len(text) < n:
+    return {text}
+  return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def jaccard(s1: Set[str], s2: Set[str]) -> float:
+  """The Jaccard similarity of two sets"""
+  if not s1 and not s2:
+    return 0.0
+  return len(s1 & s2) / len(s1 | s2)
+
+
+class MinHashIndex:
+  """Finds the phrases with the most similar sets of character n-grams
+
+  Example use:
+
+  index = MinHashIndex()
+  index.add(['中国人民', '中国人', '美国人'])
+  print(index.find_similar('中国人民大学', 2))
+  """
+
+  def __init__(self, bands: int = BANDS_DEF, rows: int = ROWS_DEF,
+               n: int = NGRAM_DEF, seed: int = 0):
+    """Constructor, for an empty index
+
+    Params:
+      bands: The number of bands of the signatures
+      rows: The number of rows, or hash values, in each band
+      n: The number of characters in each shingle
+      seed: The seed of the random hash functions
+    """
+    if bands < 1 or rows < 1 or n < 1:
+      raise ValueError(f'Bands {bands}, rows {rows} and n {n} must be '
+                       'positive')
+    self._bands = bands
+    self._rows = rows
+    self._n = n
+    rand = random.Random(seed)
+    num_hashes = bands * rows
+    self._a = np.array([rand.randrange(1, _PRIME) for _ in range(num_hashes)],
+                       dtype=np.uint64)
+    self._b = np.array([rand.randrange(0, _PRIME) for _ in range(num_hashes)],
+                       dtype=np.uint64)
+    self._phrases: List[str] = []
+    self._ids: Dict[str, int] = {}
+    # Phrase ids keyed by the bytes of each band of their signatures
+    self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+
+  @property
+  def phrases(self) -> List[str]:
+    """The phrases in the index, in the order added"""
+    return self._phrases
+
+  def add(self, phrases: Iterable[str]):
+    """Adds phrases to the index, skipping empty and repeated phrases"""
+    new = []
+    for phrase in phrases:
+      if phrase and phrase not in self._ids:
+        self._ids[phrase] = len(self._phrases)
+        self._phrases.append(phrase)
+        new.append(phrase)
+    first = len(self._phrases) - len(new)
+    for start in range(0, len(new), _CHUNK):
+      signatures = self.signatures(new[start:start + _CHUNK])
+      for i, signature in enumerate(signatures, first + start):
+        for band, bucket in enumerate(self._band_keys(signature)):
+          self._buckets[band].setdefault(bucket, []).append(i)
+
+  def candidates(self, query: str) -> Set[int]:
+    """The ids of the phrases sharing a bucket with the query"""
+    if not query:
+      return set()
+    signature = self.signatures([query])[0]
+    found = set()
+    for band, bucket in enumerate(self._band_keys(signature)):
+      found.update(self._buckets[band].get(bucket, ()))
+    return found
+
+  def find_similar(self, query: str, k: int) -> List[Tuple[str, float]]:
+    """Finds the candidate phrases with the highest Jaccard similarity
+
+    Params:
+      query: the phrase to match
+      k: the number of phrases to return
+    Return: (phrase, Jaccard similarity) pairs, most similar first, leaving
+      out the query itself
+    """
+    query_shingles = shingles(query, self._n)
+    scored = []
+    for i in self.candidates(query):
+      phrase = self._phrases[i]
+      if phrase != query:
+        scored.append((-jaccard(query_shingles, shingles(phrase, self._n)),
+                       i))
+    scored.sort()
+    return [(self._phrases[i], -neg_sim) for neg_sim, i in scored[:k]]
+
+  def signatures(self, phrases: List[str]) -> np.ndarray:
+    """The MinHash signatures of the phrases, one row per phrase
+
+    The shingles of all of the phrases are hashed together, and the minimum of
+    each hash function is taken over the shingles of each phrase.
+    """
+    hashes = []
+    offsets = []
+    for phrase in phrases:
+      offsets.append(len(hashes))
+      hashes.extend(zlib.crc32(shingle.encode('utf-8')) % _PRIME
+                    for shingle in shingles(phrase, self._n))
+    x = np.array(hashes, dtype=np.uint64)
+    values = (self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME
+    return np.minimum.reduceat(values, offsets, axis=1).T.astype(np.uint32)
+
+  def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+    """The bucket key of each band of a signature"""
+    data = signature.tobytes()
+    size = self._rows * signature.itemsize
+    return [data[band * size:(band + 1) * size]
+            for band in range(self._bands)]
+
+  def __len__(self) -> int:
+    return len(self._phrases)
+
+
+def measure_recall(index: MinHashIndex,
+                   sim_index: similarity.SimilarityIndex,
+                   queries: List[str]) -> dict:
+  """Measures the recall of the LSH candidates against the exact search
+
+  For each query, the exact result is the set of keys with the most same
+  characters, from SimilarityIndex.find_similar_same_chars. The query itself
+  is not counted as a candidate, since the exact search leaves it out.
+
+  Params:
+    index: the MinHash index, containing the dictionary keys
+    sim_index: the exact index over the dictionary
+    queries: the queries to measure
+  Return: a dictionary of results
+  """
+  recalls = []
+  num_candidates = 0
+  lsh_seconds = 0.0
+  exact_seconds = 0.0
+  for query in queries:
+    t0 = time.perf_counter()
+    found = {index.phrases[i] for i in index.candidates(query)}
+    # Like find_similar_same_chars, leave out the query itself
+    found.discard(query)
+    t1 = time.perf_counter()
+    exact = sim_index.find_similar_same_chars(query)
+    t2 = time.perf_counter()
+    lsh_seconds += t1 - t0
+    exact_seconds += t2 - t1
+    num_candidates += len(found)
+    if exact:
+      recalls.append(len(found & exact) / len(exact))
+  n = len(queries)
+  return {
+    'queries': n,
+    'mean_recall': sum(recalls) / len(recalls) if recalls else 0.0,
+    'mean_candidates': num_candidates / n if n else 0.0,
+    'mean_lsh_ms': lsh_seconds / n * 1000 if n else 0.0,
+    'mean_exact_ms': exact_seconds / n * 1000 if n else 0.0,
+  }
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--dict_file',
+                      dest='dict_file',
+                      help='Dictionary file to load, if not Chinese Notes')
+  parser.add_argument('--corpus_dirs',
+                      dest='corpus_dirs',
+                      nargs='*',
+                      default=CORPUS_DIRS_DEF,
+                      help='Directories of text files to add phrases from')
+  parser.add_argument('--bands',
+                      dest='bands',
+                      type=int,
+                      default=BANDS_DEF,
+                      help='Number of bands of the signatures')
+  parser.add_argument('--rows',
+                      dest='rows',
+                      type=int,
+                      default=ROWS_DEF,
+                      help='Number of rows in each band')
+  parser.add_argument('--ngram',
+                      dest='ngram',
+                      type=int,
+                      default=NGRAM_DEF,
+                      help='Number of characters in each shingle')
+  parser.add_argument('--num_queries',
+                      dest='num_queries',
+                      type=int,
+                      default=NUM_QUERIES_DEF,
+                      help='Number of keys sampled as queries for recall')
+  parser.add_argument('--outfile',
+                      dest='outfile',
+                      default=OUTFILE_DEF,
+                      help='File name to write JSON results to')
+  args = parser.parse_args()
+  wdict = benchmark.load_dictionary(args.dict_file)
+  keys = list(wdict)
+  sentences = [sentence.strip()
+               for sentence in benchmark.load_corpus(args.corpus_dirs or [])]
+  index = MinHashIndex(args.bands, args.rows, args.ngram)
+  t0 = time.perf_counter()
+  index.add(keys)
+  index.add(sentences)
+  build_seconds = time.perf_counter() - t0
+  logging.info(f'Indexed {len(index)} keys and phrases in '
+               f'{build_seconds:.2f} s')
+  sim_index = similarity.SimilarityIndex(wdict)
+  rand = random.Random(0)
+  results = {
+    'bands': args.bands,
+    'rows': args.rows,
+    'ngram': args.ngram,
+    'build_seconds': build_seconds,
+  }
+  for name, population in (('key_queries', keys),
+                           ('sentence_queries', sentences)):
+    if population:
+      queries = rand.sample(population, min(args.num_queries, len(population)))
+      logging.info(f'Measuring recall for {name}')
+      results[name] = measure_recall(index, sim_index, queries)
+  with open(args.outfile, 'w', encoding='utf-8') as f:
+    json.dump(results, f, ensure_ascii=False, indent=2)
+  logging.info(f'Recall results written to {args.outfile}')
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
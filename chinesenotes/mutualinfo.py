@@ -84,6 +84,27 @@ def load_freq(fname):
   logging.info('load_freq: {} count loaded from {}'.format(count, fname))
   return (dist, count)
 
+def load_doc_freq(fname):
+  """Reads term frequencies from a document frequency TSV file
+
+  The file has a header line and one line per term and document, with the
+  term in the first column and its frequency in the document in the second, as
+  in dharani_doc_freq.tsv. The frequencies are summed over the documents.
+  """
+  dist = {}
+  count = 0
+  with codecs.open(fname, 'r', 'utf-8') as f:
+    next(f, None)
+    for line in f:
+      fields = line.split('\t')
+      if len(fields) > 1:
+        key = fields[0]
+        val = int(fields[1])
+        dist[key] = dist.get(key, 0) + val
+        count += val
+  logging.info('load_doc_freq: {} count loaded from {}'.format(count, fname))
+  return (dist, count)
+
 def write_mi(fname, mi):
   """Writes the mutual informaiton distribution to the TSV output file
   """
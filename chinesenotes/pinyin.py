@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Segmentation of unsegmented pinyin, such as 'zhongguoren', into syllables.
+
+The valid syllables are held in a trie, with and without tone marks and with
+tone numbers, so that the syllables starting at each position of a query are
+found by one walk of the trie. Since a syllable has at most seven letters,
+including a tone number, the segmentation with the fewest syllables is found
+in time linear in the length of the query. The number of segmentations can
+grow exponentially with the length, so they are listed lazily, best first, up
+to a limit.
+
+Syllables can also be encoded as integers, with the initial, final and tone in
+separate bit fields, so that pinyin can be compared with or without tones.
+"""
+
+import argparse
+import heapq
+import logging
+from typing import Iterator, List, Tuple, Union
+
+from chinesenotes.cache import LRUCache
+from chinesenotes.trie import Trie
+
+CACHE_SIZE_DEF = 1024
+SEGMENTATIONS_DEF = 10
+PART_CACHE_SIZE = 1 << 16
+
+# Syllables of Hanyu Pinyin without tones, with ü also written as v
+SYLLABLES = '''
+a ai an ang ao
+ba bai ban bang bao bei ben beng bi bian biao bie bin bing bo bu
+ca cai can cang cao ce cen ceng cha chai chan chang chao che chen cheng chi
+chong chou chu chua chuai chuan chuang chui chun chuo ci cong cou cu cuan cui
+cun cuo
+da dai dan dang dao de dei den deng di dia dian diao die ding diu dong dou du
+duan dui dun duo
+e ei en eng er
+fa fan fang fei fen feng fo fou fu
+ga gai gan gang gao ge gei gen geng gong gou gu gua guai guan guang gui gun guo
+ha hai han hang hao he hei hen heng hong hou hu hua huai huan huang hui hun huo
+ji jia jian jiang jiao jie jin jing jiong jiu ju juan jue jun
+ka kai kan kang kao ke kei ken keng kong kou ku kua kuai kuan kuang kui kun kuo
+la lai lan lang lao le lei leng li lia lian liang liao lie lin ling liu lo long
+lou lu luan lun luo lü lüe lv lve
+ma mai man mang mao me mei men meng mi mian miao mie min ming miu mo mou mu
+na nai nan nang nao ne nei nen neng ni nian niang niao nie nin ning niu nong
+nou nu nuan nuo nü nüe nv nve
+o ou
+pa pai pan pang pao pei pen peng pi pian piao pie pin ping po pou pu
+qi qia qian qiang qiao qie qin qing qiong qiu qu quan que qun
+ran rang rao re ren reng ri rong rou ru rua ruan rui run ruo
+sa sai san sang sao se sen seng sha shai shan shang shao she shei shen sheng shi
+shou shu shua shuai shuan shuang shui shun shuo si song sou su suan sui sun suo
+ta tai tan tang tao te teng ti tian tiao tie ting tong tou tu tuan tui tun tuo
+wa wai wan wang wei wen weng wo wu
+xi xia xian xiang xiao xie xin xing xiong xiu xu xuan xue xun
+ya yan yang yao ye yi yin ying yo yong you yu yuan yue yun
+za zai zan zang zao ze zei zen zeng zha zhai zhan zhang zhao zhe zhei zhen zheng
+zhi zhong zhou zhu zhua zhuai zhuan zhuang zhui zhun zhuo zi zong zou zu zuan
+zui zun zuo
+'''.split()
+
+# Vowels with the marks for tones 1 to 4
+TONE_MARKS = {
+  'a': 'āáǎà',
+  'e': 'ēéěè',
+  'i': 'īíǐì',
+  'o': 'ōóǒò',
+  'u': 'ūúǔù',
+  'ü': 'ǖǘǚǜ',
+}
+
+# Initials, with y and w treated as initials, two letter initials first
+INITIALS = ['zh', 'ch', 'sh', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l', 'g', 'k',
+            'h', 'j', 'q', 'x', 'r', 'z', 'c', 's', 'y', 'w']
+
+# Layout of an encoded syllable: initial, final and tone, from high to low bits
+TONE_BITS = 3
+FINAL_BITS = 6
+TONE_MASK = (1 << TONE_BITS) - 1
+NEUTRAL_TONE = 5
+
+# Vowels with tone marks mapped to the plain vowel and tone
+_MARKED = {mark: (vowel, tone)
+           for vowel, marks in TONE_MARKS.items()
+           for tone, mark in enumerate(marks, 1)}
+
+
+def split_syllable(syllable: str) -> Tuple[str, str, int]:
+  """Splits a syllable into its initial, final and tone
+
+  The tone is given by a tone mark or a trailing tone number. Syllables with
+  neither have the neutral tone, 5. The letter v is read as ü.
+
+  Params:
+    syllable: A single syllable, such as 'zhōng', 'zhong1' or 'lv'
+  Return: the initial, empty if there is none, the final and the tone
+  """
+  tone = NEUTRAL_TONE
+  letters = []
+  for c in syllable.lower():
+    if c in _MARKED:
+      c, tone = _MARKED[c]
+    elif c.isdigit():
+      tone = int(c)
+      continue
+    letters.append(c)
+  base = ''.join(letters).replace('v', 'ü')
+  for initial in INITIALS:
+    if base.startswith(initial) and len(base) > len(initial):
+      return initial, base[len(initial):], tone
+  return '', base, tone
+
+
+# Finals of the valid syllables
+FINALS = sorted({split_syllable(syllable)[1] for syllable in SYLLABLES})
+
+_INITIAL_CODES = {initial: i for i, initial in enumerate([''] + INITIALS)}
+_FINAL_CODES = {final: i for i, final in enumerate(FINALS, 1)}
+
+
+def encode_syllable(syllable: str) -> int:
+  """Encodes a syllable as an integer
+
+  Params:
+    syllable: A single syllable, with or without a tone
+  Return: the code, with the tone in the lowest TONE_BITS bits, the final
+    above it in FINAL_BITS bits and the initial in the highest bits
+  Raises: ValueError if the syllable is not valid pinyin
+  """
+  initial, final, tone = split_syllable(syllable)
+  if final not in _FINAL_CODES or not 1 <= tone <= NEUTRAL_TONE:
+    raise ValueError(f'Not a pinyin syllable: {syllable}')
+  code = _INITIAL_CODES[initial] << FINAL_BITS | _FINAL_CODES[final]
+  return code << TONE_BITS | tone
+
+
+def decode_syllable(code: int) -> Tuple[str, str, int]:
+  """The initial, final and tone of an encoded syllable"""
+  final = (code >> TONE_BITS) & ((1 << FINAL_BITS) - 1)
+  initial = code >> (TONE_BITS + FINAL_BITS)
+  return ([''] + INITIALS)[initial], FINALS[final - 1], code & TONE_MASK
+
+
+def tone_variants(syllable: str) -> List[str]:
+  """The syllable with each tone mark and with tone numbers 1 to 5
+
+  The mark goes on a or e if there is one, on the o of ou, and otherwise on the
+  last vowel.
+  """
+  variants = [f'{syllable}{tone}' for tone in range(1, 6)]
+  if 'a' in syllable:
+    pos = syllable.index('a')
+  elif 'e' in syllable:
+    pos = syllable.index('e')
+  elif 'ou' in syllable:
+    pos = syllable.index('o')
+  else:
+    vowels = [i for i, c in enumerate(syllable) if c in TONE_MARKS]
+    if not vowels:
+      return variants
+    pos = vowels[-1]
+  for mark in TONE_MARKS[syllable[pos]]:
+    variants.append(syllable[:pos] + mark + syllable[pos + 1:])
+  return variants
+
+
+class PinyinSegmenter:
+  """Splits unsegmented pinyin into valid syllables
+
+  Example use:
+
+  segmenter = PinyinSegmenter()
+  print(segmenter.segment('zhongguoren'))
+  print(segmenter.segmentations('xian'))
+
+  Output:
+  ('zhong', 'guo', 'ren')
+  [('xian',), ('xi', 'an')]
+  """
+
+  def __init__(self, cache_size: int = CACHE_SIZE_DEF):
+    """Constructor, building the trie of syllables
+
+    Params:
+      cache_size: The number of queries to keep results for
+    """
+    keys = set(SYLLABLES)
+    for syllable in SYLLABLES:
+      keys.update(tone_variants(syllable))
+    self._trie = Trie()
+    self._trie.build_sorted(sorted(keys))
+    self._cache = LRUCache(cache_size)
+    # Encodings of words between boundaries, which recur across a dictionary
+    self._part_cache = LRUCache(PART_CACHE_SIZE)
+    self._codes = {key: encode_syllable(key) for key in keys}
+    # Erhua at the end of a word, as in wánr, is encoded as the syllable
+    # without the r, when there is no segmentation without it
+    self._erhua = {f'{key}r' for key in keys
+                   if not key[-1].isdigit() and f'{key}r' not in keys}
+    self._codes.update({erhua: self._codes[erhua[:-1]]
+                        for erhua in self._erhua})
+    self._max_len = max(len(key) for key in self._codes)
+
+  @property
+  def cache(self) -> LRUCache:
+    """The cache of segmentations, for hit and miss counts"""
+    return self._cache
+
+  def encode(self, query: str) -> Tuple[int, ...]:
+    """Encodes the syllables of the segmentation with the fewest syllables
+
+    Unlike segment, a final r is read as erhua if there is no segmentation
+    without it, and the codes of each word are cached, so that this is fast
+    enough to encode the pinyin of a whole dictionary.
+
+    Params:
+      query: The pinyin to encode
+    Return: the encoded syllables, empty if the query cannot be segmented
+    """
+    codes = ()
+    for part in query.lower().replace("'", ' ').split():
+      part_codes = self._part_cache.get(part)
+      if part_codes is None:
+        syllables = self._fewest_syllables(part, False)
+        if syllables is None:
+          syllables = self._fewest_syllables(part, True)
+        part_codes = (tuple(self._codes[syllable] for syllable in syllables)
+                      if syllables is not None else ())
+        self._part_cache.put(part, part_codes)
+      if not part_codes:
+        return ()
+      codes += part_codes
+    return codes
+
+  def segment(self, query: str) -> Tuple[str, ...]:
+    """The segmentation with the fewest syllables, or an empty tuple if the
+    query cannot be segmented
+
+    Spaces and apostrophes, as in xi'an, are kept as syllable boundaries. The
+    query is matched case insensitively.
+    """
+    text = query.lower()
+    result = self._cache.get(text)
+    if result is None:
+      result = ()
+      for part in text.replace("'", ' ').split():
+        syllables = self._fewest_syllables(part, False)
+        if syllables is None:
+          result = ()
+          break
+        result += syllables
+      self._cache.put(text, result)
+    return result
+
+  def segmentations(self, query: str,
+                    limit: int = SEGMENTATIONS_DEF) -> List[Tuple[str, ...]]:
+    """Finds the best valid segmentations of the query into syllables
+
+    Spaces and apostrophes, as in xi'an, are kept as syllable boundaries. The
+    query is matched case insensitively.
+
+    Params:
+      query: The pinyin to segment
+      limit: The maximum number of segmentations to return
+    Return: the segmentations, fewest syllables first and then in
+      lexicographic order, empty if there are none
+    """
+    segmentations = []
+    for segmentation in self._iter_segmentations(query.lower()):
+      if len(segmentations) >= limit:
+        break
+      segmentations.append(segmentation)
+    return segmentations
+
+  def _iter_segmentations(self, text: str) -> Iterator[Tuple[str, ...]]:
+    """Generates the segmentations in order, best first
+
+    The ends of the syllables starting at each position are found by walking
+    the trie from there, without crossing boundaries. Working back from the
+    end of the text, a position is kept only if a segmentation of the rest of
+    the text starts from it, along with the fewest syllables of such a
+    segmentation. Partial segmentations are then expanded from a heap ordered
+    by the fewest syllables of any completion and then by the syllables so
+    far, which are never after those of a completion, so that segmentations
+    come off the heap in order and the enumeration never follows a dead end.
+    """
+    parts = text.replace("'", ' ').split()
+    if not parts:
+      return
+    text = ''.join(parts)
+    n = len(text)
+    ends = []
+    for part in parts:
+      offset = len(ends)
+      for i in range(len(part)):
+        ends.append([offset + j for j in self._syllable_ends(part, i)])
+    counts = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+      ends[i] = [j for j in ends[i] if j == n or counts[j]]
+      if ends[i]:
+        counts[i] = 1 + min(counts[j] for j in ends[i])
+    if not counts[0]:
+      return
+    heap = [(counts[0], (), 0)]
+    while heap:
+      _, syllables, i = heapq.heappop(heap)
+      if i == n:
+        yield syllables
+        continue
+      for j in ends[i]:
+        heapq.heappush(heap, (len(syllables) + 1 + counts[j],
+                              syllables + (text[i:j],), j))
+
+  def _fewest_syllables(self, text: str,
+                        erhua: bool) -> Union[Tuple[str, ...], None]:
+    """The first segmentation of text without boundaries, in the order of
+    segmentations, or None if there is none
+
+    If erhua is true the last syllable may end with an r.
+
+    Working back from the end of the text, only the number of syllables and
+    the end of the first syllable of the best segmentation of each suffix are
+    kept. Ties are broken by the first syllable, which differs between any two
+    candidates for the same suffix, so that each position takes constant time.
+    """
+    n = len(text)
+    codes = self._codes
+    counts = [0] * (n + 1)
+    ends = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+      for j in range(i + 1, min(n, i + self._max_len) + 1):
+        syllable = text[i:j]
+        if syllable in self._erhua and (j < n or not erhua):
+          continue
+        if j < n and not counts[j]:
+          continue
+        if syllable not in codes:
+          continue
+        count = counts[j] + 1
+        if (not counts[i] or count < counts[i] or
+            (count == counts[i] and syllable < text[i:ends[i]])):
+          counts[i] = count
+          ends[i] = j
+    if not counts[0]:
+      return None
+    return self._syllables_from(text, 0, ends[0], ends)
+
+  @staticmethod
+  def _syllables_from(text: str, start: int, end: int,
+                      ends: List[int]) -> Tuple[str, ...]:
+    """The syllables of the segmentation of the suffix from start, given the
+    end of its first syllable and of the best segmentations of later suffixes
+    """
+    syllables = []
+    while start < len(text):
+      syllables.append(text[start:end])
+      start = end
+      end = ends[start]
+    return tuple(syllables)
+
+  def _syllable_ends(self, text: str, start: int) -> List[int]:
+    """The end positions of the syllables that start at the given position"""
+    ends = []
+    state = self._trie.start
+    for i in range(start, len(text)):
+      trans = self._trie.children(state).get(text[i])
+      if trans is None:
+        break
+      state = next(iter(trans.next_states))
+      if state.accepting:
+        ends.append(i + 1)
+    return ends
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--query',
+                      dest='query',
+                      required=True,
+                      help='Unsegmented pinyin to split into syllables')
+  parser.add_argument('--limit',
+                      dest='limit',
+                      type=int,
+                      default=SEGMENTATIONS_DEF,
+                      help='The maximum number of segmentations to print')
+  args = parser.parse_args()
+  segmenter = PinyinSegmenter()
+  for segmentation in segmenter.segmentations(args.query, args.limit):
+    print(' '.join(segmentation))
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
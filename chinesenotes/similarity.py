@@ -21,19 +21,793 @@ Methods for computing similarity of strings of Chinese characters
 """
 
 import argparse
+import csv
+import heapq
+import json
 import logging
+import multiprocessing
 import os
-from typing import List, Mapping, Set
+from array import array
+from collections import Counter
+from itertools import islice
+from operator import eq, ne
+from typing import (Any, Dict, FrozenSet, List, Mapping, Sequence, Set,
+                    Tuple)
 
 from chinesenotes import cndict
+from chinesenotes.cache import LRUCache
 from chinesenotes.cndict_types import DictionaryEntry
+from chinesenotes.pinyin import NEUTRAL_TONE, TONE_MASK, PinyinSegmenter
 
 MIN_LEN = 2
+TOP_K_DEF = 10
+CACHE_SIZE_DEF = 10000
+FEATURE_CHUNK_DEF = 1 << 16
+FEATURES_OUTFILE_DEF = 'data/phrase_similarity_features.csv'
+# Largest distance, which any key is at least as close as
+_MAX_DISTANCE = 100
+
+# Columns of the phrase similarity training data, as written by
+# sim_log_parser. Is Relevant is a label from review, not a feature.
+TRAINING_COLUMNS = ['Query', 'Rank', 'Term', 'Pinyin Match', 'In Notes',
+                    'Unigram Count', 'Hamming', 'Is Substring', 'Is Relevant']
+
+# Features of the relevance classifier trained by similarity_train
+RELEVANCE_FEATURES = ['Unigram count', 'Hamming distance', 'Query length']
+
+# Key, pinyin and simplified rows used by ShardedSimilarity worker processes,
+# set by _init_shard_worker
+_worker_rows = None
+
+
+class RelevanceModel:
+  """A decision tree exported by similarity_train, to score candidates
+
+  Candidates are scored without scikit-learn by following the exported nodes
+  from the root to a leaf.
+  """
+
+  def __init__(self, model: Mapping[str, Any]):
+    """Constructor
+
+    Args:
+      model: the exported tree, with the feature names and a list of nodes,
+        each with a feature index, threshold, left and right child indexes,
+        -1 for a leaf, and the fraction of relevant training points
+    Raises:
+      ValueError if the features are not RELEVANCE_FEATURES
+    """
+    if model['feature_names'] != RELEVANCE_FEATURES:
+      raise ValueError(f'Unexpected features {model["feature_names"]}')
+    self._nodes = [(node['feature'], node['threshold'], node['left'],
+                    node['right'], node['relevance'])
+                   for node in model['nodes']]
+    self._max_score = max(node[4] for node in self._nodes if node[2] < 0)
+
+  @property
+  def max_score(self) -> float:
+    """The highest score of any leaf"""
+    return self._max_score
+
+  def score(self, features: Sequence[float]) -> float:
+    """The fraction of relevant training points in the leaf for the features
+
+    Args:
+      features: the values of RELEVANCE_FEATURES
+    """
+    feature, threshold, left, right, relevance = self._nodes[0]
+    while left >= 0:
+      node = left if features[feature] <= threshold else right
+      feature, threshold, left, right, relevance = self._nodes[node]
+    return relevance
+
+
+def load_relevance_model(fname: str) -> RelevanceModel:
+  """Loads a relevance model exported by similarity_train"""
+  with open(fname, 'r') as f:
+    return RelevanceModel(json.load(f))
+
+
+class SimilarityIndex:
+  """Precomputed dictionary data for repeated similarity searches
+
+  The pinyin and simplified forms of every entry are rolled up once, when the
+  index is built, instead of in every search. The searches give the same
+  results as the functions of the same names in this module, including which
+  keys are kept when several are equally similar.
+
+  The pinyin of each entry is also encoded as syllables, with the initial,
+  final and tone of each syllable kept separately, for searches by syllable
+  with or without tones.
+  """
+
+  def __init__(self, wdict: Mapping[str, DictionaryEntry]):
+    """Constructor
+
+    Args:
+      wdict: the dictionary to search, which should not change afterwards
+    """
+    self._wdict = wdict
+    self._keys = list(wdict)
+    self._ids = {key: i for i, key in enumerate(self._keys)}
+    self._pinyin = [wdict[key].pinyin for key in self._keys]
+    self._simplified = [wdict[key].simplified for key in self._keys]
+    # Key, pinyin and simplified with their lengths, for the fused search
+    self._rows = _similarity_rows(wdict)
+    # Ids of the keys containing each character, in increasing order
+    self._postings: Dict[str, array] = {}
+    for i, key in enumerate(self._keys):
+      for c in set(key):
+        postings = self._postings.get(c)
+        if postings is None:
+          postings = self._postings[c] = array('I')
+        postings.append(i)
+    # Ids of the keys with each character at each position, bucketed by length
+    self._buckets: Dict[int, Dict[Tuple[int, str], array]] = {}
+    for i, key in enumerate(self._keys):
+      bucket = self._buckets.setdefault(len(key), {})
+      for pos, c in enumerate(key):
+        postings = bucket.get((pos, c))
+        if postings is None:
+          postings = bucket[(pos, c)] = array('I')
+        postings.append(i)
+    # Readings of each key as encoded syllables, and the rows of all readings
+    # bucketed by number of syllables with (position, syllable) postings
+    segmenter = PinyinSegmenter()
+    self._syllables: List[Tuple[Tuple[int, ...], ...]] = []
+    self._reading_keys = array('I')
+    self._syllable_buckets: Dict[int, Tuple[array,
+                                 Dict[Tuple[int, int], array]]] = {}
+    for i, pinyin in enumerate(self._pinyin):
+      readings = tuple(codes for codes in map(segmenter.encode,
+                                              pinyin.split(',')) if codes)
+      self._syllables.append(readings)
+      for codes in readings:
+        row = len(self._reading_keys)
+        self._reading_keys.append(i)
+        rows, bucket = self._syllable_buckets.setdefault(len(codes),
+                                                         (array('I'), {}))
+        rows.append(row)
+        for pos, code in enumerate(codes):
+          postings = bucket.get((pos, code))
+          if postings is None:
+            postings = bucket[(pos, code)] = array('I')
+          postings.append(row)
+    # Ids of the keys with each simplified form
+    self._same_simplified: Dict[str, List[int]] = {}
+    for i, simplified in enumerate(self._simplified):
+      self._same_simplified.setdefault(simplified, []).append(i)
+
+  def find_homophones(self, w: str, tones: bool = False)->Set[str]:
+    """Finds the words with the same syllables as a reading of w
+
+    Words with the same simplified form as w are left out.
+
+    Args:
+      w: the word to find homophones of, which must be in the dictionary
+      tones: whether the tones must also be the same
+    Returns:
+      The homophones, empty if the pinyin of w could not be encoded
+    Raises:
+      KeyError if w is not in the dictionary
+    """
+    w_id = self._ids[w]
+    excluded = self._same_simplified[self._simplified[w_id]]
+    homophones = set()
+    for codes in self._syllables[w_id]:
+      matches = self._syllable_matches(codes, len(codes), tones)
+      for row, m in matches.items():
+        key_id = self._reading_keys[row]
+        if m == len(codes) and key_id not in excluded:
+          homophones.add(self._keys[key_id])
+    return homophones
+
+  def find_similar_pinyin(self, w: str, tones: bool = True)->Set[str]:
+    """Finds the most similar words based on syllable distance
+
+    The distance is given by syllable_distance for the closest readings of the
+    two words. Readings with a different number of syllables than that of w are
+    visited in order of the difference, which bounds the distance, and only
+    readings sharing a syllable at some position are compared individually.
+    Words with the same simplified form as w are left out, as in
+    find_hamming_pinyin. Unlike the other searches, all words at the minimum
+    distance are returned, whatever their length.
+
+    Args:
+      w: the word to find similar words for, which must be in the dictionary
+      tones: whether syllables with different tones differ
+    Returns:
+      The most similar words, empty if the pinyin of w could not be encoded
+    Raises:
+      KeyError if w is not in the dictionary
+    """
+    w_id = self._ids[w]
+    excluded = set(self._same_simplified[self._simplified[w_id]])
+    d_min = None
+    most_similar = set()
+    for codes in self._syllables[w_id]:
+      d, nearest = self._nearest_reading(codes, tones, excluded)
+      if d is None:
+        continue
+      if d_min is None or d < d_min:
+        d_min = d
+        most_similar = nearest
+      elif d == d_min:
+        most_similar |= nearest
+    return {self._keys[i] for i in most_similar}
+
+  def _nearest_reading(self, codes: Tuple[int, ...], tones: bool,
+                       excluded: Set[int])->Tuple[int, Set[int]]:
+    """Finds the ids of the keys with a reading closest to the given one
+
+    Returns:
+      The minimum distance, None if there are no other readings, and the ids
+    """
+    la = len(codes)
+    d_min = None
+    nearest = set()
+    for lb in sorted(self._syllable_buckets, key=lambda lb: abs(la - lb)):
+      if d_min is not None and abs(la - lb) > d_min:
+        break
+      matches = self._syllable_matches(codes, lb, tones)
+      # Readings sharing no syllable at any position are at the longer length
+      size = max(la, lb)
+      for row, m in matches.items():
+        key_id = self._reading_keys[row]
+        if key_id in excluded:
+          continue
+        d = size - m
+        if d_min is None or d < d_min:
+          d_min = d
+          nearest = {key_id}
+        elif d == d_min:
+          nearest.add(key_id)
+      if d_min is not None and size > d_min:
+        continue
+      for row in self._syllable_buckets[lb][0]:
+        key_id = self._reading_keys[row]
+        if row in matches or key_id in excluded:
+          continue
+        if d_min is None or size < d_min:
+          d_min = size
+          nearest = {key_id}
+        elif size == d_min:
+          nearest.add(key_id)
+    return d_min, nearest
+
+  def _syllable_matches(self, codes: Tuple[int, ...], lb: int,
+                        tones: bool)->Dict[int, int]:
+    """Counts the positions where readings of lb syllables match the codes
+
+    Returns:
+      The number of matching positions keyed by row, for rows with any
+    """
+    matches = Counter()
+    if lb not in self._syllable_buckets:
+      return matches
+    bucket = self._syllable_buckets[lb][1]
+    for pos in range(min(len(codes), lb)):
+      if tones:
+        lookup = (codes[pos],)
+      else:
+        toneless = codes[pos] & ~TONE_MASK
+        lookup = range(toneless + 1, toneless + NEUTRAL_TONE + 1)
+      for code in lookup:
+        for row in bucket.get((pos, code), ()):
+          matches[row] += 1
+    return matches
+
+  def find_similar(self, w: str)->List[str]:
+    """Finds the most similar words based on multiple measures
+
+    Computes the Hamming distance, the number of same characters and the pinyin
+    Hamming distance for each key in one pass over the dictionary.
+
+    Args:
+      w: the word to find similar words for, which must be in the dictionary
+    Returns:
+      The union of the most similar words by each measure
+    Raises:
+      KeyError if w is not in the dictionary
+    """
+    w_id = self._ids[w]
+    pinyin = self._pinyin[w_id]
+    simplified = self._simplified[w_id]
+    chars = set(w)
+    lw = len(w)
+    lp = len(pinyin)
+    d_min = 100
+    hamming = set()
+    sim_max = 0
+    same_chars = set()
+    dp_min = 100
+    hamming_pinyin = set()
+    for key, lk, other, lo, other_simplified in self._rows:
+      if key == w: # Same word, skip
+        continue
+      is_long = lk >= MIN_LEN
+      # Most keys have no characters in common with w, in which case the
+      # Hamming distance is the length of w and there are no same characters
+      if chars.isdisjoint(key):
+        d = lw
+        sim = 0
+      else:
+        # Same as hamming_distance(w, key) and num_same_chars(w, key)
+        d = sum(map(ne, w, key))
+        if lw > lk:
+          d += lw - lk
+        sim = sum(map(key.__contains__, w))
+      if d < d_min and is_long: # new min
+        d_min = d
+        hamming = {key}
+      elif d == d_min: # tie
+        hamming.add(key)
+      if sim > sim_max and is_long: # new max
+        sim_max = sim
+        same_chars = {key}
+      elif sim == sim_max: # tie
+        same_chars.add(key)
+      # Same word, or the pinyin distance is at least the difference in length
+      # and so can neither beat nor tie the minimum
+      if simplified == other_simplified or lp - lo > dp_min:
+        continue
+      d = sum(map(ne, pinyin, other))
+      if lp > lo:
+        d += lp - lo
+      if d < dp_min and is_long: # new min
+        dp_min = d
+        hamming_pinyin = {key}
+      elif d == dp_min: # tie
+        hamming_pinyin.add(key)
+    return list(hamming | same_chars | hamming_pinyin)
+
+
+  def find_similar_hamming(self, w: str)->Set[str]:
+    """Finds the most similar words based on Hamming distance
+
+    The distance from w to a key is the length of w less the number of
+    positions where they have the same character, so only keys in the postings
+    of the characters of w at their positions need to be visited. Buckets of
+    keys shorter than w are at least the difference in length away, so they
+    are visited in order of that bound and the search stops once the bound
+    exceeds the minimum found. If no key of at least MIN_LEN characters
+    matches w at any position the dictionary is scanned instead, since then
+    every key ties.
+
+    Args:
+      w: the word to find similar words for, which need not be in the
+        dictionary
+    Returns:
+      The same words as find_similar_hamming
+    """
+    lw = len(w)
+    if lw >= 100: # Not less than the initial minimum of the scan
+      return find_similar_hamming(w, self._wdict)
+    w_id = self._ids.get(w)
+    distances = {}
+    d_min = lw
+    first = len(self._keys)
+    for lk in sorted(self._buckets, key=lambda lk: max(0, lw - lk)):
+      if lw - lk > d_min:
+        break
+      bucket = self._buckets[lk]
+      matches = Counter()
+      for pos in range(min(lw, lk)):
+        for i in bucket.get((pos, w[pos]), ()):
+          matches[i] += 1
+      matches.pop(w_id, None)
+      for i, m in matches.items():
+        d = lw - m
+        distances[i] = d
+        if lk >= MIN_LEN and (d < d_min or (d == d_min and i < first)):
+          d_min = d
+          first = i
+    if d_min == lw:
+      return find_similar_hamming(w, self._wdict)
+    keys = self._keys
+    return {keys[i] for i, d in distances.items() if d == d_min and i >= first}
+
+  def find_similar_same_chars(self, w: str)->Set[str]:
+    """Finds the most similar words based on number of same characters
+
+    Only the keys in the postings of the characters of w are visited. The
+    result is the same as the scan by find_similar_same_chars: the keys with
+    the most same characters from the first key of at least MIN_LEN characters
+    reaching that number onwards.
+
+    Args:
+      w: the word to find similar words for, which need not be in the
+        dictionary
+    Returns:
+      The most similar words
+    """
+    counts = self._count_same_chars(w)
+    best = 0
+    first = len(self._keys)
+    for i, sim in counts.items():
+      if len(self._keys[i]) < MIN_LEN:
+        continue
+      if sim > best or (sim == best and i < first):
+        best = sim
+        first = i
+    keys = self._keys
+    if best == 0:
+      # No key sharing a character counts, so every key that shares none ties
+      # with the initial maximum of zero
+      return {key for i, key in enumerate(keys) if i not in counts and key != w}
+    return {keys[i] for i, sim in counts.items() if sim == best and i >= first}
+
+  def top_relevant(self, w: str, k: int,
+                   model: RelevanceModel)->List[Tuple[str, float]]:
+    """Finds the k keys scored most relevant to w by the classifier
+
+    The features are computed for the keys sharing a character with w, found
+    from the character postings. As in the training data, the unigram count
+    counts each different character of w once, and the Hamming distance counts
+    the positions beyond the end of the shorter string. Ties in score are
+    broken by higher unigram count, then smaller Hamming distance, then
+    dictionary order. The keys are visited in decreasing unigram count and
+    kept in a heap of size k, so the search stops once the heap holds k keys
+    with the highest possible score.
+
+    Args:
+      w: the word to find relevant words for, which need not be in the
+        dictionary
+      k: the number of keys to return
+      model: the classifier to score keys with
+    Returns:
+      (key, score) pairs, most relevant first
+    """
+    if k <= 0:
+      return []
+    by_count = {}
+    for i, sim in self._count_unigrams(w).items():
+      by_count.setdefault(sim, []).append(i)
+    lw = len(w)
+    heap = []
+    for sim in sorted(by_count, reverse=True):
+      if len(heap) == k and heap[0][0] >= model.max_score:
+        break
+      for i in by_count[sim]:
+        key = self._keys[i]
+        d = max(lw, len(key)) - sum(map(eq, w, key))
+        entry = (model.score((sim, d, lw)), sim, -d, -i)
+        if len(heap) < k:
+          heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+          heapq.heapreplace(heap, entry)
+    return [(self._keys[-i], score)
+            for score, _, _, i in sorted(heap, reverse=True)]
+
+  def top_same_chars(self, w: str, k: int)->List[Tuple[str, int]]:
+    """Finds the k keys with the most characters in common with w
+
+    Args:
+      w: the word to find similar words for
+      k: the number of keys to return
+    Returns:
+      (key, number of same characters) pairs, most first and then in dictionary
+      order
+    """
+    counts = self._count_same_chars(w)
+    top = heapq.nlargest(k, counts.items(),
+                         key=lambda item: (item[1], -item[0]))
+    return [(self._keys[i], sim) for i, sim in top]
+
+  def _count_same_chars(self, w: str)->Dict[int, int]:
+    """Counts num_same_chars(w, key) for each key sharing a character with w
+
+    Returns:
+      The counts keyed by key id, excluding w itself
+    """
+    counts = Counter()
+    for c, n in Counter(w).items():
+      for i in self._postings.get(c, ()):
+        counts[i] += n
+    w_id = self._ids.get(w)
+    if w_id is not None:
+      del counts[w_id]
+    return counts
+
+  def _count_unigrams(self, w: str)->Dict[int, int]:
+    """Counts the different characters of w in each key sharing one with w
+
+    This is the unigram count of the training data, in which a character
+    repeated in w is counted once, unlike num_same_chars.
+
+    Returns:
+      The counts keyed by key id, excluding w itself
+    """
+    counts = Counter()
+    for c in set(w):
+      counts.update(self._postings.get(c, ()))
+    w_id = self._ids.get(w)
+    if w_id is not None:
+      del counts[w_id]
+    return counts
+
+
+class CachedSimilarity:
+  """Memoizes the results of find_similar for repeated queries
+
+  Results are keyed by the query and the version of the dictionary, which
+  changes whenever the dictionary is replaced or reloaded, so that results
+  for an old dictionary are never returned. The cache is also cleared then,
+  so that the old results do not take up its capacity.
+
+  Example use:
+
+  similar = CachedSimilarity(wdict, maxsize=1000, ttl=3600)
+  for query in queries:
+    print(similar.find_similar(query))
+  print(similar.cache)
+  """
+
+  def __init__(self,
+               wdict: Mapping[str, DictionaryEntry],
+               maxsize: int = CACHE_SIZE_DEF,
+               ttl: float = None):
+    """Constructor
+
+    Args:
+      wdict: the dictionary to search
+      maxsize: the maximum number of queries to hold results for
+      ttl: the number of seconds that results are kept, forever if not given
+    """
+    self._cache = LRUCache(maxsize, ttl)
+    self._version = 0
+    self.set_dictionary(wdict)
+
+  @property
+  def cache(self) -> LRUCache:
+    """The cache, including hit, miss and eviction counters"""
+    return self._cache
+
+  @property
+  def version(self) -> int:
+    """The version of the dictionary, incremented each time it is set"""
+    return self._version
+
+  def find_similar(self, w: str)->List[str]:
+    """Finds the most similar words with find_similar or from the cache"""
+    key = (w, self._version)
+    most_similar = self._cache.get(key)
+    if most_similar is None:
+      most_similar = tuple(self._index.find_similar(w))
+      self._cache.put(key, most_similar)
+    return list(most_similar)
+
+  def reload(self, fname: str = None):
+    """Reloads the dictionary with cndict.open_dictionary
+
+    Args:
+      fname: the file or remote URL to read the dictionary from
+    """
+    self.set_dictionary(cndict.open_dictionary(fname))
+
+  def set_dictionary(self, wdict: Mapping[str, DictionaryEntry]):
+    """Replaces the dictionary, clearing the cached results"""
+    self._index = SimilarityIndex(wdict)
+    self._version += 1
+    self._cache.clear()
+
+
+class ShardedSimilarity:
+  """Searches shards of the dictionary in parallel with a pool of processes
+
+  The keys are split into contiguous shards. For each measure, each shard
+  finds its local best value and the keys at least as good, and the results
+  are merged so that the same keys are kept as by find_similar, including
+  when several are equally similar. The pool is kept between searches, so
+  call close when done, or use the object in a with statement.
+
+  Example use:
+
+  with ShardedSimilarity(wdict, processes=4) as sharded:
+    print(sharded.find_similar('中国'))
+  """
+
+  def __init__(self,
+               wdict: Mapping[str, DictionaryEntry],
+               processes: int = None,
+               shards: int = None):
+    """Constructor, starting the worker processes
+
+    Where the platform supports it the worker processes are forked so that
+    they share the rows of the dictionary with the parent.
+
+    Args:
+      wdict: the dictionary to search, which should not change afterwards
+      processes: the number of worker processes, the CPU count if not given.
+        With one process, the shards are searched in this process.
+      shards: the number of shards, the number of processes if not given
+    """
+    self._wdict = wdict
+    self._rows = _similarity_rows(wdict)
+    processes = processes or os.cpu_count() or 1
+    num_shards = max(1, min(shards or processes, len(self._rows)))
+    bounds = [len(self._rows) * i // num_shards for i in range(num_shards + 1)]
+    self._shards = list(zip(bounds, bounds[1:]))
+    self._pool = None
+    if processes > 1:
+      if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+      else:
+        context = multiprocessing.get_context()
+      self._pool = context.Pool(processes, _init_shard_worker, (self._rows,))
+
+  def close(self):
+    """Stops the worker processes"""
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+  def find_similar(self, w: str)->List[str]:
+    """Finds the most similar words based on multiple measures
+
+    Args:
+      w: the word to find similar words for, which must be in the dictionary
+    Returns:
+      The union of the most similar words by each measure
+    Raises:
+      KeyError if w is not in the dictionary
+    """
+    entry = self._wdict[w]
+    tasks = [(start, end, w, entry.pinyin, entry.simplified)
+             for start, end in self._shards]
+    if self._pool is None:
+      results = [_search_rows(self._rows, *task) for task in tasks]
+    else:
+      results = self._pool.map(_search_shard, tasks, 1)
+    hamming, same_chars, hamming_pinyin = zip(*results)
+    most_similar = _merge_shards(hamming, min)
+    most_similar |= _merge_shards(same_chars, max)
+    most_similar |= _merge_shards(hamming_pinyin, min)
+    return list(most_similar)
+
+  @property
+  def num_shards(self) -> int:
+    """The number of shards that the keys are split into"""
+    return len(self._shards)
+
+  def __enter__(self) -> 'ShardedSimilarity':
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+
+class FeatureExtractor:
+  """Computes the features of the training data for (query, term) pairs
+
+  The features are those computed by the web app for the similarity results
+  in its logs, in the columns TRAINING_COLUMNS of the training data:
+
+  Rank: the position of the term among the consecutive pairs with the same
+    query, from 1
+  Pinyin Match: whether a reading of the query has the same syllables as a
+    reading of the term, ignoring tones. A query that is not in the
+    dictionary is read with the first reading of each character.
+  In Notes: whether the query occurs in the notes of the term
+  Unigram Count: the number of different characters of the query in the
+    term. Unlike num_same_chars, a character repeated in the query is counted
+    once, as in the training data.
+  Hamming: the number of positions where the query and term differ, counting
+    the positions beyond the end of the shorter one
+  Is Substring: whether either the query or the term contains the other
+
+  As in similarity_batch, the unigram counts and Hamming distances are
+  computed with NumPy, over blocks of pairs with the same query and term
+  lengths encoded as arrays of code points. NumPy is imported only when
+  features are extracted, so that the searches in this module do not need it.
+
+  Example use:
+
+  extractor = FeatureExtractor(wdict)
+  features = extractor.extract([('中國人', '中国人'), ('中國人', '美国')])
+  print(features['Hamming'])
+  """
+
+  def __init__(self,
+               wdict: Mapping[str, DictionaryEntry],
+               chunk_size: int = FEATURE_CHUNK_DEF):
+    """Constructor
+
+    Args:
+      wdict: the dictionary with the pinyin and notes of the terms
+      chunk_size: the maximum number of pairs encoded at a time
+    """
+    self._wdict = wdict
+    self._chunk_size = chunk_size
+    self._segmenter = PinyinSegmenter()
+    self._readings_cache = LRUCache(CACHE_SIZE_DEF)
+
+  def extract(self, pairs: Sequence[Tuple[str, str]]
+              )->Dict[str, 'np.ndarray']:
+    """Computes the features of each pair
+
+    Args:
+      pairs: the (query, term) pairs, with the terms for each query together
+    Returns:
+      An array for each column of TRAINING_COLUMNS except Is Relevant, in the
+      order of the pairs
+    """
+    import numpy as np
+    n = len(pairs)
+    queries = np.array([query for query, _ in pairs], dtype=object)
+    terms = np.array([term for _, term in pairs], dtype=object)
+    rank = np.empty(n, dtype=np.int32)
+    for i, (query, _) in enumerate(pairs):
+      same_query = i > 0 and pairs[i - 1][0] == query
+      rank[i] = rank[i - 1] + 1 if same_query else 1
+    # Queries and terms repeat, so readings are looked up once for each
+    readings = {text: self._readings(text)
+                for text in set(queries).union(terms)}
+    pinyin_match = np.fromiter(
+        (not readings[query].isdisjoint(readings[term])
+         for query, term in pairs), dtype=bool, count=n)
+    in_notes = np.fromiter((self._in_notes(query, term)
+                            for query, term in pairs), dtype=bool, count=n)
+    is_substring = np.fromiter((query in term or term in query
+                                for query, term in pairs), dtype=bool, count=n)
+    unigram, hamming = _score_pairs([query for query, _ in pairs],
+                                    [term for _, term in pairs],
+                                    self._chunk_size)
+    return {
+      'Query': queries,
+      'Rank': rank,
+      'Term': terms,
+      'Pinyin Match': pinyin_match,
+      'In Notes': in_notes,
+      'Unigram Count': unigram,
+      'Hamming': hamming,
+      'Is Substring': is_substring,
+    }
+
+  def _in_notes(self, query: str, term: str)->bool:
+    """Whether the query occurs in the notes of any sense of the term"""
+    entry = self._wdict.get(term)
+    if not entry or not query:
+      return False
+    return any(sense.notes and query in sense.notes for sense in entry.senses)
+
+  def _readings(self, text: str)->FrozenSet[Tuple[int, ...]]:
+    """The readings of the text as encoded syllables without tones"""
+    readings = self._readings_cache.get(text)
+    if readings is not None:
+      return readings
+    entry = self._wdict.get(text)
+    if entry:
+      readings = frozenset(self._toneless(pinyin) for pinyin
+                           in entry.pinyin.split(',')) - {()}
+    else:
+      codes = ()
+      for c in text:
+        entry = self._wdict.get(c)
+        char_codes = self._toneless(entry.pinyin.split(',')[0]) if entry else ()
+        if not char_codes:
+          codes = ()
+          break
+        codes += char_codes
+      readings = frozenset([codes]) if codes else frozenset()
+    self._readings_cache.put(text, readings)
+    return readings
+
+  def _toneless(self, pinyin: str)->Tuple[int, ...]:
+    """The encoded syllables of the pinyin without tones"""
+    return tuple(code & ~TONE_MASK for code in self._segmenter.encode(pinyin))
 
 
 def find_similar(w: str,
-    wdict: Mapping[str, DictionaryEntry])->List[str]:
-  """Finds the most similar words in the dictionary based on multiple measures"""
+    wdict: Mapping[str, DictionaryEntry],
+    index: SimilarityIndex = None)->List[str]:
+  """Finds the most similar words in the dictionary based on multiple measures
+
+  Give an index built from wdict to search in one pass over precomputed data.
+  """
+  if index is not None:
+    return index.find_similar(w)
   most_similar = find_similar_hamming(w, wdict)
   most_similar = most_similar | find_similar_same_chars(w, wdict)
   most_similar = most_similar | find_hamming_pinyin(w, wdict)
@@ -65,8 +839,14 @@ def find_hamming_pinyin(w: str,
 
 
 def find_similar_hamming(w: str,
-    wdict: Mapping[str, DictionaryEntry])->Set[str]:
-  """Finds the most similar words based on Hamming distance"""
+    wdict: Mapping[str, DictionaryEntry],
+    index: SimilarityIndex = None)->Set[str]:
+  """Finds the most similar words based on Hamming distance
+
+  Give an index built from wdict to visit only keys matching at a position.
+  """
+  if index is not None:
+    return index.find_similar_hamming(w)
   d_min = 100
   most_similar = set()
   for key in wdict:
@@ -82,8 +862,14 @@ def find_similar_hamming(w: str,
 
 
 def find_similar_same_chars(w: str,
-    wdict: Mapping[str, DictionaryEntry])->Set[str]:
-  """Finds the most similar words based on number of same characters"""
+    wdict: Mapping[str, DictionaryEntry],
+    index: SimilarityIndex = None)->Set[str]:
+  """Finds the most similar words based on number of same characters
+
+  Give an index built from wdict to visit only the keys sharing a character.
+  """
+  if index is not None:
+    return index.find_similar_same_chars(w)
   sim_max = 0
   most_similar = set()
   for key in wdict:
@@ -109,6 +895,37 @@ def hamming_distance(w1: str, w2: str)->int:
   return d
 
 
+def syllable_distance(codes1: Tuple[int, ...], codes2: Tuple[int, ...],
+    tones: bool = True)->int:
+  """Compute the distance between two readings encoded as syllables
+
+  The distance is the number of positions with different syllables plus the
+  difference in the number of syllables.
+
+  Args:
+    codes1, codes2: syllables encoded by pinyin.encode_syllable
+    tones: whether syllables with different tones differ
+  """
+  mask = -1 if tones else ~TONE_MASK
+  d = sum((a & mask) != (b & mask) for a, b in zip(codes1, codes2))
+  return d + abs(len(codes1) - len(codes2))
+
+
+def levenshtein_distance(w1: str, w2: str)->int:
+  """Compute the edit distance between the given strings
+
+  Insertions, deletions and substitutions of a character each cost one.
+  """
+  row = list(range(len(w2) + 1))
+  for i, c1 in enumerate(w1, 1):
+    prev_row = row
+    row = [i]
+    for j, c2 in enumerate(w2, 1):
+      cost = 0 if c1 == c2 else 1
+      row.append(min(row[j - 1] + 1, prev_row[j] + 1, prev_row[j - 1] + cost))
+  return row[-1]
+
+
 def num_same_chars(w1: str, w2: str)->int:
   """Compute the similarity of two strings based on the number of matching characters"""
   sim = 0
@@ -118,6 +935,217 @@ def num_same_chars(w1: str, w2: str)->int:
   return sim
 
 
+def _init_shard_worker(rows: List[Tuple[str, int, str, int, str]]):
+  """Initializes a ShardedSimilarity worker process with the rows"""
+  global _worker_rows
+  _worker_rows = rows
+
+
+def _merge_shards(shards: Sequence[Tuple[int, int, List[Tuple[int, str, int]]]],
+    best_of)->Set[str]:
+  """Merges the local best keys of the shards for one measure
+
+  The serial search keeps the keys with the best value from the first key of
+  at least MIN_LEN characters that reaches it, or all of them if no such key
+  improves on the initial value.
+
+  Args:
+    shards: the best value, the id of the first key of at least MIN_LEN
+      characters reaching it or -1, and the (id, key, value) of the keys at
+      least as good, for each shard
+    best_of: min for distances, max for similarities
+  Returns:
+    The same keys as the serial search
+  """
+  best = best_of(value for value, _, _ in shards)
+  first = min(first for value, first, _ in shards if value == best)
+  return {key for _, _, candidates in shards
+          for i, key, value in candidates if value == best and i >= first}
+
+
+def regenerate_features(infile: str,
+    outfile: str,
+    wdict: Mapping[str, DictionaryEntry]):
+  """Recomputes the features of the pairs in a training data file
+
+  Args:
+    infile: CSV file with Query and Term columns and optionally Rank and Is
+      Relevant, such as data/phrase_similarity_training.csv
+    outfile: CSV file to write with the columns TRAINING_COLUMNS, with Rank
+      and Is Relevant copied from infile if given
+    wdict: the dictionary with the pinyin and notes of the terms
+  """
+  with open(infile, 'r', newline='') as f:
+    rows = list(csv.DictReader(f))
+  pairs = [(row['Query'], row['Term']) for row in rows]
+  features = FeatureExtractor(wdict).extract(pairs)
+  with open(outfile, 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(TRAINING_COLUMNS)
+    for i, row in enumerate(rows):
+      values = [features[column][i] for column in TRAINING_COLUMNS[:-1]]
+      values[1:] = [value if isinstance(value, str) else int(value)
+                    for value in values[1:]]
+      # The rank of the results in the logs is kept if given
+      values[1] = row.get('Rank') or values[1]
+      writer.writerow(values + [row.get('Is Relevant', '')])
+  logging.info(f'Features of {len(pairs)} pairs written to {outfile}')
+
+
+def _score_pairs(queries: List[str], terms: List[str], chunk_size: int
+    )->Tuple['np.ndarray', 'np.ndarray']:
+  """The unigram counts and Hamming distances of the pairs
+
+  The pairs are grouped by the lengths of the query and term, so that each
+  group is encoded as two arrays of code points without padding, and the
+  results are put back in the order of the pairs. Each column comparison of
+  a group costs about as much as scoring one pair in Python, so groups with
+  fewer pairs than comparisons are scored in Python.
+
+  Args:
+    queries, terms: the strings of each pair
+    chunk_size: the maximum number of pairs encoded at a time
+  Returns:
+    The unigram counts and Hamming distances, one per pair
+  """
+  import numpy as np
+  from chinesenotes.similarity_batch import encode
+  n = len(queries)
+  unigram = np.empty(n, dtype=np.int32)
+  hamming = np.empty(n, dtype=np.int32)
+  if not n:
+    return unigram, hamming
+  lengths_q = np.fromiter(map(len, queries), dtype=np.int64, count=n)
+  lengths_t = np.fromiter(map(len, terms), dtype=np.int64, count=n)
+  group_keys = lengths_q * (int(lengths_t.max()) + 1) + lengths_t
+  order = np.argsort(group_keys, kind='stable')
+  bounds = np.flatnonzero(np.diff(group_keys[order])) + 1
+  # Queries with repeated characters replaced by NUL, which is not in any term,
+  # so that each different character is counted once
+  firsts: Dict[str, str] = {}
+  for ids in np.split(order, bounds):
+    lq = int(lengths_q[ids[0]])
+    lt = int(lengths_t[ids[0]])
+    longer = max(lq, lt)
+    if len(ids) < lq * lt:
+      for i in ids.tolist():
+        query = queries[i]
+        term = terms[i]
+        unigram[i] = sum(map(term.__contains__, set(query)))
+        hamming[i] = longer - sum(map(eq, query, term))
+      continue
+    for start in range(0, len(ids), chunk_size):
+      chunk = ids[start:start + chunk_size]
+      m = len(chunk)
+      chunk_queries = [queries[i] for i in chunk.tolist()]
+      for query in chunk_queries:
+        if query not in firsts:
+          firsts[query] = ''.join(c if query.index(c) == j else '\0'
+                                  for j, c in enumerate(query))
+      q = np.asfortranarray(encode(''.join(chunk_queries)).reshape(m, lq))
+      qf = np.asfortranarray(encode(''.join(
+          firsts[query] for query in chunk_queries)).reshape(m, lq))
+      t = np.asfortranarray(encode(''.join(
+          terms[i] for i in chunk.tolist())).reshape(m, lt))
+      matches = np.zeros(m, dtype=np.int32)
+      for j in range(min(lq, lt)):
+        matches += q[:, j] == t[:, j]
+      counts = np.zeros(m, dtype=np.int32)
+      for j in range(lq):
+        found = np.zeros(m, dtype=bool)
+        for k in range(lt):
+          found |= qf[:, j] == t[:, k]
+        counts += found
+      hamming[chunk] = longer - matches
+      unigram[chunk] = counts
+  return unigram, hamming
+
+
+def _search_rows(rows: List[Tuple[str, int, str, int, str]],
+    start: int,
+    end: int,
+    w: str,
+    pinyin: str,
+    simplified: str)->Tuple[Tuple[int, int, List[Tuple[int, str, int]]], ...]:
+  """Finds the local best keys of a shard for each measure
+
+  Args:
+    rows: the key, pinyin and simplified rows of the dictionary
+    start, end: the range of rows in the shard
+    w, pinyin, simplified: the word to find similar words for, with its
+      pinyin and simplified form
+  Returns:
+    For the Hamming distance, number of same characters and pinyin Hamming
+    distance, the arguments of _merge_shards for the shard
+  """
+  chars = set(w)
+  lw = len(w)
+  lp = len(pinyin)
+  d_min = _MAX_DISTANCE
+  d_first = -1
+  hamming = []
+  sim_max = 0
+  sim_first = -1
+  same_chars = []
+  dp_min = _MAX_DISTANCE
+  dp_first = -1
+  hamming_pinyin = []
+  for i, (key, lk, other, lo, other_simplified) in enumerate(
+      islice(rows, start, end), start):
+    if key == w: # Same word, skip
+      continue
+    is_long = lk >= MIN_LEN
+    if chars.isdisjoint(key):
+      d = lw
+      sim = 0
+    else:
+      d = sum(map(ne, w, key))
+      if lw > lk:
+        d += lw - lk
+      sim = sum(map(key.__contains__, w))
+    # The best values only improve, so keys worse than the best so far are
+    # not needed, and keys kept here that end up worse are dropped below
+    if d < d_min and is_long: # new min
+      d_min = d
+      d_first = i
+    if d <= d_min:
+      hamming.append((i, key, d))
+    if sim > sim_max and is_long: # new max
+      sim_max = sim
+      sim_first = i
+    if sim >= sim_max:
+      same_chars.append((i, key, sim))
+    if simplified == other_simplified or lp - lo > dp_min:
+      continue
+    d = sum(map(ne, pinyin, other))
+    if lp > lo:
+      d += lp - lo
+    if d < dp_min and is_long: # new min
+      dp_min = d
+      dp_first = i
+    if d <= dp_min:
+      hamming_pinyin.append((i, key, d))
+  return ((d_min, d_first, [c for c in hamming if c[2] <= d_min]),
+          (sim_max, sim_first, [c for c in same_chars if c[2] >= sim_max]),
+          (dp_min, dp_first, [c for c in hamming_pinyin if c[2] <= dp_min]))
+
+
+def _search_shard(task: Tuple[int, int, str, str, str]
+    )->Tuple[Tuple[int, int, List[Tuple[int, str, int]]], ...]:
+  """Searches a shard in a ShardedSimilarity worker process"""
+  return _search_rows(_worker_rows, *task)
+
+
+def _similarity_rows(wdict: Mapping[str, DictionaryEntry]
+    )->List[Tuple[str, int, str, int, str]]:
+  """The key, pinyin and simplified of each entry with their lengths"""
+  rows = []
+  for key, entry in wdict.items():
+    pinyin = entry.pinyin
+    rows.append((key, len(key), pinyin, len(pinyin), entry.simplified))
+  return rows
+
+
 def main():
   """Command line entry point"""
   logging.basicConfig(level=logging.INFO)
@@ -131,12 +1159,72 @@ def main():
   parser.add_argument('--word',
                       dest='word',
                       help='Target to search for similar terms')
+  parser.add_argument('--queries',
+                      dest='queries',
+                      help='File with one target per line, searched with a '
+                           'cache of results for repeated targets')
+  parser.add_argument('--pairs',
+                      dest='pairs',
+                      help='CSV file of Query and Term pairs to compute the '
+                           'training data features of')
+  parser.add_argument('--features_outfile',
+                      dest='features_outfile',
+                      default=FEATURES_OUTFILE_DEF,
+                      help='CSV file to write the features of --pairs to')
+  parser.add_argument('--processes',
+                      dest='processes',
+                      type=int,
+                      help='Number of processes to search shards of the '
+                           'dictionary with in parallel')
+  parser.add_argument('--cache_size',
+                      dest='cache_size',
+                      type=int,
+                      default=CACHE_SIZE_DEF,
+                      help='Number of targets to cache results for')
+  parser.add_argument('--ttl',
+                      dest='ttl',
+                      type=float,
+                      help='Seconds to keep cached results, forever if not '
+                           'given')
+  parser.add_argument('--model',
+                      dest='model',
+                      help='Relevance model exported by similarity_train, to '
+                           'rank the most relevant terms')
+  parser.add_argument('--top_k',
+                      dest='top_k',
+                      type=int,
+                      default=TOP_K_DEF,
+                      help='Number of terms to rank with the model')
   args = parser.parse_args()
+  if args.pairs:
+    regenerate_features(args.pairs, args.features_outfile,
+                        cndict.open_dictionary())
+    return
+  if args.queries:
+    with open(args.queries, 'r') as f:
+      queries = [line.strip() for line in f if line.strip()]
+    similar = CachedSimilarity(cndict.open_dictionary(), args.cache_size,
+                               args.ttl)
+    for query in queries:
+      print(f'{query}\t{",".join(similar.find_similar(query))}')
+    logging.info(f'Searched {len(queries)} targets, {similar.cache}')
+    return
   if not args.word:
     print('Please supply target word with --word')
     return
   cnotes_dict = cndict.open_dictionary()
-  most_similar = find_similar(args.word, cnotes_dict)
+  if args.processes:
+    with ShardedSimilarity(cnotes_dict, args.processes) as sharded:
+      most_similar = sharded.find_similar(args.word)
+    logging.info(f'Words most similar to {args.word}: {most_similar}')
+    return
+  index = SimilarityIndex(cnotes_dict)
+  if args.model:
+    model = load_relevance_model(args.model)
+    ranked = index.top_relevant(args.word, args.top_k, model)
+    logging.info(f'Words most relevant to {args.word}: {ranked}')
+    return
+  most_similar = find_similar(args.word, cnotes_dict, index)
   logging.info(f'Words most similar to {args.word}: {most_similar}')
 
 # Entry point from a script
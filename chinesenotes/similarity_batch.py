@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Scores many queries against all dictionary keys with vectorized comparisons.
+
+The keys are encoded once as a 2-D NumPy array of code points, padded with
+zeros and sorted by length, so that the keys of each length form a block
+without padding. The array is stored in column major order, so that each
+position of a block is a contiguous vector, and each query is compared with
+the blocks a position at a time. The features are those of the phrase
+similarity training data, such as data/phrase_similarity_training.csv:
+
+Unigram count: the number of different characters of the query in the key.
+  As in the training data, a character repeated in the query is counted once,
+  unlike similarity.num_same_chars(query, key).
+Hamming: the number of positions where the query and key differ, counting the
+  positions beyond the end of the shorter one. This is the same as
+  similarity.hamming_distance(query, key) for keys no longer than the query.
+Is substring: whether either the query or the key contains the other
+"""
+
+import argparse
+import csv
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from chinesenotes import cndict
+
+OUTFILE_DEF = 'data/phrase_similarity_candidates.csv'
+TOP_DEF = 10
+
+
+def encode(text: str) -> np.ndarray:
+  """The code points of the text as an array"""
+  return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+class BatchScorer:
+  """Computes similarity features of queries against all dictionary keys
+
+  Example use:
+
+  scorer = BatchScorer(wdict)
+  hamming, unigram, substring = scorer.score('中國人')
+  print(scorer.keys[np.argmax(unigram)])
+  """
+
+  def __init__(self, keys: Iterable[str]):
+    """Constructor, encoding the keys
+
+    Args:
+      keys: the dictionary keys, empty strings are ignored
+    """
+    self._keys = sorted((key for key in keys if key), key=len)
+    self._lengths = np.array([len(key) for key in self._keys], dtype=np.int32)
+    width = int(self._lengths[-1]) if self._keys else 0
+    padded = ''.join(key.ljust(width, '\0') for key in self._keys)
+    self._codes = np.asfortranarray(
+        encode(padded).reshape(len(self._keys), width))
+    self._ids = {key: i for i, key in enumerate(self._keys)}
+    # Dense ids of the characters, from 1, at the first occurrence of each
+    # character in a key and 0 elsewhere, so that repeated characters and
+    # padding are not counted
+    unique, inverse = np.unique(self._codes, return_inverse=True)
+    offset = 1 if len(unique) and unique[0] else 0
+    self._char_ids = {chr(c): i + offset for i, c in enumerate(unique) if c}
+    inverse += offset
+    self._first_ids = np.asfortranarray(
+        inverse.reshape(self._codes.shape).astype(np.int32))
+    for j in range(1, width):
+      for i in range(j):
+        self._first_ids[self._codes[:, i] == self._codes[:, j], j] = 0
+    # (length, start, end) of the block of keys of each length
+    self._blocks: List[Tuple[int, int, int]] = []
+    for length in np.unique(self._lengths):
+      start, end = np.searchsorted(self._lengths, [length, length + 1])
+      self._blocks.append((int(length), int(start), int(end)))
+
+  @property
+  def codes(self) -> np.ndarray:
+    """The code points of the keys, one row per key padded with zeros"""
+    return self._codes
+
+  @property
+  def keys(self) -> List[str]:
+    """The keys in the order of the scores, by increasing length"""
+    return self._keys
+
+  def score(self, query: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Scores the query against every key
+
+    Args:
+      query: the query to score
+    Returns:
+      The Hamming distances, unigram counts and substring flags, each an array
+      in the order of keys
+    """
+    q = encode(query)
+    lq = len(q)
+    n = len(self._keys)
+    hamming = np.empty(n, dtype=np.int32)
+    unigram = np.empty(n, dtype=np.int32)
+    # The empty query is a substring of every key
+    substring = np.full(n, lq == 0)
+    # One for each different character of the query, by character id
+    weights = np.zeros(len(self._char_ids) + 1, dtype=np.int32)
+    for c in set(query):
+      if c in self._char_ids:
+        weights[self._char_ids[c]] = 1
+    for length, start, end in self._blocks:
+      columns = [self._codes[start:end, j] for j in range(length)]
+      matches = np.zeros(end - start, dtype=np.int32)
+      for j in range(min(lq, length)):
+        matches += columns[j] == q[j]
+      hamming[start:end] = max(lq, length) - matches
+      counted = unigram[start:end]
+      counted[:] = 0
+      for j in range(length):
+        counted += weights[self._first_ids[start:end, j]]
+      if 0 < lq < length:
+        found = substring[start:end]
+        for offset in range(length - lq + 1):
+          at_offset = columns[offset] == q[0]
+          for j in range(1, lq):
+            at_offset &= columns[offset + j] == q[j]
+          found |= at_offset
+    # Keys contained in the query are among its substrings
+    for i in range(lq):
+      for j in range(i + 1, lq + 1):
+        key_id = self._ids.get(query[i:j])
+        if key_id is not None:
+          substring[key_id] = True
+    return hamming, unigram, substring
+
+  def score_batch(self, queries: Iterable[str]
+                  ) -> Iterator[Tuple[str, np.ndarray, np.ndarray, np.ndarray]]:
+    """Scores each query against every key
+
+    Args:
+      queries: the queries to score
+    Returns:
+      For each query, the query with its Hamming distances, unigram counts and
+      substring flags, as returned by score
+    """
+    for query in queries:
+      yield (query,) + self.score(query)
+
+  def top(self, query: str, k: int) -> List[Tuple[str, int, int, bool]]:
+    """The k keys with the highest unigram count, then lowest Hamming distance
+
+    Args:
+      query: the query to score
+      k: the number of keys to return
+    Returns:
+      (key, unigram count, Hamming distance, is substring) for each key, best
+      first, leaving out the query itself
+    """
+    hamming, unigram, substring = self.score(query)
+    # Sort on unigram count descending, then Hamming distance ascending
+    order = np.lexsort((hamming, -unigram))
+    top = []
+    for i in order:
+      key = self._keys[i]
+      if key == query:
+        continue
+      top.append((key, int(unigram[i]), int(hamming[i]), bool(substring[i])))
+      if len(top) >= k:
+        break
+    return top
+
+
+def run(queries: List[str], outfile: str, top: int):
+  """Writes the best candidates for each query with their features
+
+  Args:
+    queries: the queries to find candidates for
+    outfile: CSV file to write the candidates to
+    top: the number of candidates per query
+  """
+  wdict = cndict.open_dictionary()
+  scorer = BatchScorer(wdict)
+  with open(outfile, 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(['Query', 'Rank', 'Term', 'Unigram Count', 'Hamming',
+                     'Is Substring'])
+    for query in queries:
+      for rank, (key, unigram, hamming, substring) in enumerate(
+          scorer.top(query, top), 1):
+        writer.writerow([query, rank, key, unigram, hamming, int(substring)])
+  logging.info(f'Candidates for {len(queries)} queries written to {outfile}')
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--queries',
+                      dest='queries',
+                      required=True,
+                      help='File with one query per line')
+  parser.add_argument('--outfile',
+                      dest='outfile',
+                      default=OUTFILE_DEF,
+                      help='CSV file to write the candidates to')
+  parser.add_argument('--top',
+                      dest='top',
+                      type=int,
+                      default=TOP_DEF,
+                      help='Number of candidates per query')
+  args = parser.parse_args()
+  with open(args.queries, 'r') as f:
+    queries = [line.strip() for line in f if line.strip()]
+  run(queries, args.outfile, args.top)
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
@@ -19,11 +19,13 @@
 """
 Trains a decision tree classifier for phrase similarity.
 
-Reads the input file and trains the classifier.
+Reads the input file and trains the classifier. The classifier can be exported
+as JSON for ranking similar terms with similarity.SimilarityIndex.top_relevant.
 """
 
 import argparse
 import csv
+import json
 import logging
 import graphviz
 import matplotlib.pyplot as plt
@@ -31,27 +33,57 @@ from sklearn import tree
 from sklearn.metrics import classification_report
 from sklearn.tree import export_graphviz
 
+from chinesenotes.similarity import RELEVANCE_FEATURES
+
 
 INFILE_DEF = 'data/phrase_similarity_combined.csv'
 OUTFILE_DEF = 'drawings/phrase_similarity_graph.png'
 
 
-def run(infile, outfile, val_file):
+def run(infile, outfile, val_file, model_file=''):
   """Load training data and train the classifier
 
   Args:
     infile: input file with the mutual information and training points
     outfile: file name to write graphviz export to
+    model_file: file name to export the classifier to, if not empty
   """
   x, y = load_training2(infile)
   feature_names = ['Unigram count / len', 'Hamming distance / len']
   train(x, y, feature_names, outfile)
   x, y = load_training3(infile)
-  feature_names = ['Unigram count', 'Hamming distance', 'Query length']
+  feature_names = RELEVANCE_FEATURES
   clf = train(x, y, feature_names, outfile)
   if len(val_file) > 0:
     x, y = load_training3(val_file)
     validate(clf, x, y, feature_names)
+  if len(model_file) > 0:
+    export_model(clf, feature_names, model_file)
+
+
+def export_model(clf, feature_names, outfile):
+  """Export the classifier as JSON for similarity.RelevanceModel
+
+  Args:
+    clf: the trained classifier
+    feature_names: Names of feature variables
+    outfile: file name to write the model to
+  """
+  t = clf.tree_
+  relevant = list(clf.classes_).index(1)
+  nodes = []
+  for i in range(t.node_count):
+    values = t.value[i][0]
+    nodes.append({
+      'feature': int(t.feature[i]),
+      'threshold': float(t.threshold[i]),
+      'left': int(t.children_left[i]),
+      'right': int(t.children_right[i]),
+      'relevance': float(values[relevant] / values.sum()),
+    })
+  with open(outfile, 'w') as f:
+    json.dump({'feature_names': feature_names, 'nodes': nodes}, f, indent=2)
+  logging.info(f'Classifier exported to {outfile}')
 
 
 def train(x, y, feature_names, outfile):
@@ -161,13 +193,17 @@ def main():
                       dest='outfile',
                       default=OUTFILE_DEF, 
                       help='File name to write output to')
+  parser.add_argument('--model',
+                      dest='model',
+                      default='',
+                      help='File name to export the classifier to as JSON')
   parser.add_argument('--valfile',
                       dest='valfile',
                       default="", 
                       help='File name to read validation data from')
   args = parser.parse_args()
   logging.info(f'Training decision tree from {args.infile}, output to {args.outfile}')
-  run(args.infile, args.outfile, args.valfile)
+  run(args.infile, args.outfile, args.valfile, args.model)
 
 
 # Entry point from a script
@@ -27,7 +27,16 @@ References:
    Algorithms Using Python and C#, John Wiley & Sons, Kindle ed.
 """
 
-from typing import List, Set, Union
+import gc
+import heapq
+import logging
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Set, Tuple, Union
+
+# Number of offsets to try when packing a row of a compiled transition table
+_PACK_TRIES = 64
+
 
 class State:
   """State of a finite state machine"""
@@ -110,15 +119,16 @@ class FSM:
   A finite state machine is also known as an automaton. It is non-deterministic
   to allow for easier construction and for early rejection if the transition
   function leads to an empty set of next nodes. However, the implementation does
-  not know how to recognizes transitions that return more than one state.
-  Transitions for empty are not allowed.
+  not know how to recognizes transitions that return more than one state, and
+  raises an FSMException for them. Use compile to get a deterministic automaton
+  for an FSM with such transitions. Transitions for empty are not allowed.
 
   References:
     1. Sipser 2012, pp. 31-47
     2. Stephens 2019, ch. 15
   """
   def __init__(self):
-    self._trans_table = {}
+    self._children = {} # State value to transitions keyed by input symbol
     self._start = State(0, False)
     self._states = {self._start}
     self._alphabet = set()
@@ -146,19 +156,18 @@ class FSM:
       next_states: Set of next states
     Raise: FSMException if symbol is an empty string
     """
-    trans = Transition(start, symbol, next_states)
-    key = '{}{}'.format(start.value, symbol)
     if symbol == '':
       raise FSMException('Transitions based on empty strings are not allowed, '
                          'state: {}'.format(start))
-    if key in self._trans_table:
-      print('Transition from state {} with {} already exists'.format(start,
-                                                                     symbol))
-      trans = self._trans_table[key]
+    children = self._children.setdefault(start.value, {})
+    if symbol in children:
+      logging.debug('Transition from state %s with %s already exists', start,
+                    symbol)
+      trans = children[symbol]
       for state in next_states:
         trans.add_next_state(state)
     else:
-      self._trans_table[key] = trans
+      children[symbol] = Transition(start, symbol, next_states)
       self._alphabet.add(symbol)
 
   def add_transition(self, start: State, symbol: str, next_state: State):
@@ -172,6 +181,53 @@ class FSM:
     """
     self.add_transitions(start, symbol, {next_state})
 
+  def children(self, state: State) -> Dict[str, Transition]:
+    """The transitions out of the given state, keyed by input symbol
+
+    Param:
+      state: The current state
+    Return: A dictionary of transitions, empty if there are none
+    """
+    return self._children.get(state.value, {})
+
+  def compile(self) -> 'CompiledFSM':
+    """Compiles the FSM into a deterministic automaton held in integer arrays
+
+    Subset construction gives one deterministic state for each set of states
+    that the FSM can be in, so that the compiled automaton is never ambiguous.
+    Only states reachable from the start state are kept.
+
+    Return: the compiled automaton
+    Raise: FSMException if a transition symbol is not a single character
+    """
+    for symbol in self._alphabet:
+      if len(symbol) != 1:
+        raise FSMException('Only single character symbols can be compiled, '
+                           'symbol: {}'.format(symbol))
+    accepting = {state.value for state in self._states if state.accepting}
+    start = frozenset([self._start.value])
+    subsets = {start: 0}
+    rows = [] # Transitions out of each deterministic state, symbol to state
+    final = []
+    queue = deque([start])
+    while queue:
+      subset = queue.popleft()
+      targets = {}
+      for value in subset:
+        for symbol, trans in self._children.get(value, {}).items():
+          next_values = targets.setdefault(symbol, set())
+          next_values.update(state.value for state in trans.next_states)
+      row = {}
+      for symbol, next_values in targets.items():
+        next_subset = frozenset(next_values)
+        if next_subset not in subsets:
+          subsets[next_subset] = len(subsets)
+          queue.append(next_subset)
+        row[symbol] = subsets[next_subset]
+      rows.append(row)
+      final.append(not accepting.isdisjoint(subset))
+    return CompiledFSM(rows, final)
+
   def new_state(self, accepting=False) -> State:
     """Creates a new state, adding it to the list of states"""
     state = State(len(self._states), accepting)
@@ -198,8 +254,9 @@ class FSM:
         return False
       if len(next_states) > 1:
         # don't know what to do
-        FSMException('Encountered multiple states for state {}, symbol {}, '
-                     'next: {}'.format(state, character, next_states))
+        raise FSMException('Encountered multiple states for state {}, '
+                           'symbol {}, next: {}'.format(state, character,
+                                                        next_states))
       else:
         state = next(iter(next_states))
     return state.accepting
@@ -227,16 +284,23 @@ class FSM:
       inval: The input symbol to be read
     Return: The set of next state an empty if there is no transition table entry
     """
-    #print('transition state: {}, inval: {}'.format(state, inval))
-    key = str(state.value) + str(inval)
-    if key in self._trans_table:
-      return self._trans_table[key].next_states
+    trans = self._children.get(state.value, {}).get(inval)
+    if trans:
+      return trans.next_states
     return set()
 
   @property
-  def transitions(self) -> Set:
-    """The set of state transitions"""
-    return self._trans_table
+  def transitions(self) -> Dict[str, Transition]:
+    """The state transitions, keyed by start state value and input symbol
+
+    The table is derived from the transitions out of each state when needed,
+    so that it does not cost anything while building.
+    """
+    table = {}
+    for value, children in self._children.items():
+      for symbol, trans in children.items():
+        table['{}{}'.format(value, symbol)] = trans
+    return table
 
   def __repr__(self):
     return """
@@ -249,7 +313,150 @@ class FSM:
                  self._states,
                  self._start,
                  self.accepting_states,
-                 self._trans_table)
+                 self.transitions)
+
+
+class CompiledFSM:
+  """A deterministic finite state machine packed into integer arrays
+
+  Created with FSM.compile. Symbols are mapped to small integers through a
+  table indexed by code point. A dense table of states by symbols would be far
+  too large for a dictionary with thousands of distinct characters, so the
+  rows of the transition table are overlapped with row displacement: the
+  transition from state s on symbol c is at slot t = base[s] + c and is valid
+  if check[t] == s, in which case the next state is next[t]. Recognition is
+  then a walk over the arrays without any objects or string keys.
+
+  References:
+    1. Aho, A, Lam, M, Sethi, R, and Ullman, J 2006, Compilers: Principles,
+       Techniques, and Tools, 2nd ed., Addison-Wesley, sec. 3.9.8.
+  """
+
+  def __init__(self, rows: List[Dict[str, int]], final: List[bool]):
+    """Constructor, use FSM.compile instead of calling this directly
+
+    Params:
+      rows: The transitions out of each state, keyed by symbol, with the start
+        state first
+      final: Whether each state is accepting
+    """
+    # Number the symbols from the most to the least used, so that the rows
+    # crowd into the low numbers and overlap more. Numbers start at 1 so that
+    # 0 marks a character not in the alphabet.
+    counts = {}
+    for row in rows:
+      for symbol in row:
+        counts[symbol] = counts.get(symbol, 0) + 1
+    symbols = sorted(counts, key=lambda symbol: (-counts[symbol], symbol))
+    max_code = max((ord(symbol) for symbol in symbols), default=0)
+    typecode = 'H' if len(symbols) < 2**16 else 'i'
+    self._symbols = array(typecode, [0]) * (max_code + 1)
+    for i, symbol in enumerate(symbols, 1):
+      self._symbols[ord(symbol)] = i
+    self._num_symbols = len(symbols)
+    self._final = array('B', final)
+    self._base = array('i', [0]) * len(rows)
+    self._pack(rows)
+
+  def recognizes(self, to_test: str) -> bool:
+    """Tests whether the given string is recognized by the automaton"""
+    symbols = self._symbols
+    num_codes = len(symbols)
+    base = self._base
+    check = self._check
+    next_state = self._next
+    size = len(check)
+    state = 0
+    for character in to_test:
+      code = ord(character)
+      if code >= num_codes:
+        return False
+      t = base[state] + symbols[code]
+      if t >= size or check[t] != state:
+        return False
+      state = next_state[t]
+    return self._final[state] == 1
+
+  @property
+  def num_states(self) -> int:
+    """The number of deterministic states"""
+    return len(self._base)
+
+  @property
+  def num_symbols(self) -> int:
+    """The number of distinct symbols in the alphabet"""
+    return self._num_symbols
+
+  @property
+  def size(self) -> int:
+    """The length of the packed next and check arrays"""
+    return len(self._check)
+
+  def transition(self, state: int, symbol: str) -> int:
+    """The next state for the state and symbol, or -1 if there is none"""
+    code = ord(symbol)
+    if code >= len(self._symbols) or self._symbols[code] == 0:
+      return -1
+    t = self._base[state] + self._symbols[code]
+    if t >= len(self._check) or self._check[t] != state:
+      return -1
+    return self._next[t]
+
+  @staticmethod
+  def _fit(check: array,
+           codes: List[Tuple[int, int]],
+           start: int,
+           tries: int) -> int:
+    """Finds the first offset from start that puts every symbol of a row in a
+    free slot, or -1 if there is none in the given number of tries
+    """
+    size = len(check)
+    first = codes[0][0]
+    for b in range(start, start + tries):
+      if b + first < size and check[b + first] >= 0:
+        continue
+      if all(b + code >= size or check[b + code] < 0 for code, _ in codes):
+        return b
+    return -1
+
+  def _pack(self, rows: List[Dict[str, int]]):
+    """Overlaps the rows of the transition table, first fit
+
+    Rows are placed from the most to the least transitions, trying a bounded
+    number of offsets from the lowest free slot before overlapping the row
+    with the end of the table.
+    """
+    symbols = self._symbols
+    # Slot 0 is never used, since symbol numbers start at 1
+    check = array('i', [-1])
+    next_state = array('i', [0])
+    first_free = 1
+    order = sorted(range(len(rows)), key=lambda state: -len(rows[state]))
+    for state in order:
+      codes = sorted((symbols[ord(symbol)], target)
+                     for symbol, target in rows[state].items())
+      if not codes:
+        continue
+      while first_free < len(check) and check[first_free] >= 0:
+        first_free += 1
+      b = self._fit(check, codes, max(first_free - codes[0][0], 0),
+                    _PACK_TRIES)
+      if b < 0:
+        # Overlap the row with the sparse end of the table instead, so that
+        # a wide row only extends the table by a little
+        b = self._fit(check, codes,
+                      max(len(check) - codes[-1][0], 0), len(check))
+      end = b + codes[-1][0] + 1
+      if end > len(check):
+        extra = end - len(check)
+        check.extend(array('i', [-1]) * extra)
+        next_state.extend(array('i', [0]) * extra)
+      self._base[state] = b
+      for code, target in codes:
+        check[b + code] = state
+        next_state[b + code] = target
+    self._check = check
+    self._next = next_state
 
 
 class Trie(FSM):
@@ -265,11 +472,14 @@ class Trie(FSM):
     dict_entries = ['zha', 'zhang', 'zhan', 'zhao', 'fang']
     trie.build(dict_entries)
     prefix = 'zh'
-    terms = trie.find_with_prefix(prefix)
+    terms = trie.find_with_prefix(prefix, ordered=True)
     print('Prefix {} has terms {}'.format(prefix, terms))
+    trie.set_frequencies({'zha': 5, 'zhang': 20, 'zhan': 8, 'zhao': 12})
+    print('Top 2: {}'.format(trie.top_k(prefix, 2)))
 
     Output:
-    Prefix zh has terms ['zha', 'zhan', 'zhao', 'zhang']
+    Prefix zh has terms ['zha', 'zhan', 'zhang', 'zhao']
+    Top 2: [('zhang', 20), ('zhao', 12)]
   """
 
   def __init__(self):
@@ -279,6 +489,8 @@ class Trie(FSM):
       alphabet: The alphabet for the trie
     """
     FSM.__init__(self)
+    self._freq = {} # State value to frequency of the term ending there
+    self._max_freq = {} # State value to maximum frequency of any descendant
 
   def build(self, dict_entries: List[str]):
     """Builds a dictionary matching trie
@@ -298,33 +510,226 @@ class Trie(FSM):
         state = new_state
       state.accepting = True
 
-  def find_with_prefix(self, prefix: str) -> List[str]:
+  def build_sorted(self, keys: Iterable[str]):
+    """Builds a dictionary matching trie from keys in lexicographic order
+
+    Keys sharing a prefix with the previous key reuse the states on its path,
+    so the trie is built in one pass over the keys, creating each state and
+    transition directly. Duplicate keys are skipped. The cyclic garbage
+    collector is paused while building, since the new objects are all kept and
+    scanning them repeatedly would take as long as building.
+
+    Params:
+      keys: The dictionary keys, in lexicographic order, eg sorted(wdict)
+    Raises: FSMException if the keys are not in lexicographic order or if the
+      trie is not empty
+    """
+    if len(self._states) > 1:
+      raise FSMException('Sorted construction needs an empty trie')
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+      self._build_sorted(keys)
+    finally:
+      if gc_enabled:
+        gc.enable()
+
+  def _build_sorted(self, keys: Iterable[str]):
+    """Adds the keys in one pass, see build_sorted"""
+    path = [self.start] # States on the path of the previous key
+    previous = ''
+    alphabet = self._alphabet
+    for key in keys:
+      if key < previous:
+        raise FSMException('Key {} follows {} out of order'.format(key,
+                                                                   previous))
+      common = 0
+      for a, b in zip(key, previous):
+        if a != b:
+          break
+        common += 1
+      del path[common + 1:]
+      state = path[-1]
+      for character in key[common:]:
+        next_state = self.new_state()
+        children = self._children.get(state.value)
+        if children is None:
+          children = self._children[state.value] = {}
+        children[character] = Transition(state, character, {next_state})
+        alphabet.add(character)
+        path.append(next_state)
+        state = next_state
+      state.accepting = True
+      previous = key
+
+  def find_with_prefix(self,
+                       prefix: str,
+                       limit: int = None,
+                       ordered: bool = False) -> List[str]:
     """Finds the all the dictionary terms with the given prefix
 
+    Only the transitions that exist out of each state are followed, so the
+    cost depends on the number of completions and not the size of the alphabet.
+
     Params:
       prefix: the string to test
+      limit: the maximum number of terms to return, all if not given
+      ordered: if True return terms in lexicographic order
     Return: dictionary terms with the given prefix
     Raises: FSMException if multiple states encountered following the FSM
     """
     prefix_state = self._read_prefix(prefix)
-    #print('Prefix {} has state {}'.format(prefix, prefix_state))
     terms = [] # Terms to return
-    if prefix_state and prefix_state.accepting:
-      terms.append(prefix)
-    stack = []
-    stack.append((prefix_state, prefix))
+    if prefix_state is None:
+      return terms
+    stack = [(prefix_state, prefix)]
     while len(stack) > 0:
       # Remove next candidate state and prefix from stack
       (state, candidate_term) = stack.pop()
-      for character in self.alphabet:
+      if state.accepting:
+        terms.append(candidate_term)
+        if limit is not None and len(terms) >= limit:
+          break
+      children = self.children(state)
+      symbols = sorted(children, reverse=True) if ordered else list(children)
+      for character in symbols:
         next_term = '{}{}'.format(candidate_term, character)
-        next_states = self.transition(state, character)
-        for next_state in next_states:
-          if next_state.accepting:
-            terms.append(next_term)
+        for next_state in children[character].next_states:
           stack.append((next_state, next_term))
     return terms
 
+  def find_fuzzy(self, query: str, max_dist: int) -> List[Tuple[str, int]]:
+    """Finds the dictionary terms within an edit distance of the query
+
+    Walks the trie in step with a Levenshtein automaton for the query,
+    simulated by one row of the edit distance table per state, and prunes
+    each subtree as soon as no completion of it can be within max_dist. Once a
+    row has used up the distance, only the transitions on the characters that
+    the automaton can still accept are looked up, instead of all of them.
+
+    Params:
+      query: the string to match
+      max_dist: the maximum Levenshtein distance
+    Return: pairs of term and distance, nearest first and then in
+      lexicographic order
+    """
+    terms, _ = self.fuzzy_walk(query, max_dist)
+    return terms
+
+  def fuzzy_walk(self,
+                 query: str,
+                 max_dist: int) -> Tuple[List[Tuple[str, int]], int]:
+    """Finds the terms within max_dist of the query, see find_fuzzy
+
+    Params:
+      query: the string to match
+      max_dist: the maximum Levenshtein distance
+    Return: the terms with their distances, as from find_fuzzy, and the number
+      of transitions followed, to compare the cost with a full scan
+    """
+    columns = len(query) + 1
+    first_row = list(range(columns))
+    terms = []
+    if self._start.accepting and first_row[-1] <= max_dist:
+      terms.append(('', first_row[-1]))
+    visited = 0
+    stack = [(self._start, '', first_row)]
+    while stack:
+      state, term, row = stack.pop()
+      children = self.children(state)
+      if min(row) == max_dist:
+        # Any edit would exceed max_dist, so only the characters that match
+        # the query at a position still within the distance can be followed
+        viable = {query[i] for i in range(len(query)) if row[i] == max_dist}
+        edges = [(c, children[c]) for c in viable if c in children]
+      else:
+        edges = children.items()
+      for character, trans in edges:
+        visited += 1
+        # Row of the edit distance table for the query against term + character
+        new_row = [row[0] + 1]
+        for i in range(1, columns):
+          cost = 0 if query[i - 1] == character else 1
+          new_row.append(min(new_row[i - 1] + 1, row[i] + 1, row[i - 1] + cost))
+        if min(new_row) > max_dist:
+          continue
+        next_term = '{}{}'.format(term, character)
+        for next_state in trans.next_states:
+          if next_state.accepting and new_row[-1] <= max_dist:
+            terms.append((next_term, new_row[-1]))
+          stack.append((next_state, next_term, new_row))
+    terms.sort(key=lambda term: (term[1], term[0]))
+    return terms, visited
+
+  def set_frequencies(self, freq: Mapping[str, int]):
+    """Sets the term frequencies used to rank completions in top_k
+
+    Each state records the frequency of the term ending there and the maximum
+    frequency of any term below it, which bounds the best-first search. Terms
+    not in freq have frequency zero and frequencies for words not in the trie
+    are ignored.
+
+    Params:
+      freq: frequency of each dictionary term, eg from term_freq.tsv
+    """
+    self._freq = {}
+    for term, count in freq.items():
+      state = self._read_prefix(term)
+      if state is not None and state.accepting:
+        self._freq[state.value] = count
+    # Visit the states depth first, then fold the maximum up from the leaves
+    order = []
+    stack = [self._start]
+    while stack:
+      state = stack.pop()
+      order.append(state)
+      for trans in self.children(state).values():
+        stack.extend(trans.next_states)
+    self._max_freq = {}
+    for state in reversed(order):
+      best = self._freq.get(state.value, 0)
+      for trans in self.children(state).values():
+        for next_state in trans.next_states:
+          best = max(best, self._max_freq[next_state.value])
+      self._max_freq[state.value] = best
+
+  def top_k(self, prefix: str, k: int) -> List[Tuple[str, int]]:
+    """Finds the k most frequent dictionary terms with the given prefix
+
+    Runs a best-first search ordered by the maximum descendant frequency, so
+    only the branches that can hold one of the top k terms are expanded, even
+    for prefixes with thousands of completions. Ties are broken in
+    lexicographic order. Call set_frequencies first, otherwise all terms have
+    frequency zero.
+
+    Params:
+      prefix: the prefix to complete
+      k: the number of terms to return
+    Return: up to k pairs of term and frequency, most frequent first
+    """
+    prefix_state = self._read_prefix(prefix)
+    terms = []
+    if prefix_state is None or k < 1:
+      return terms
+    # Entries are (negated bound, string, kind, state), with kind 0 for a
+    # complete term and 1 for a state still to expand. The first three items
+    # are unique, so states are never compared.
+    heap = [(-self._max_freq.get(prefix_state.value, 0), prefix, 1,
+             prefix_state)]
+    while heap and len(terms) < k:
+      neg_freq, term, kind, state = heapq.heappop(heap)
+      if kind == 0:
+        terms.append((term, -neg_freq))
+        continue
+      if state.accepting:
+        heapq.heappush(heap, (-self._freq.get(state.value, 0), term, 0, state))
+      for character, trans in self.children(state).items():
+        next_term = '{}{}'.format(term, character)
+        for next_state in trans.next_states:
+          heapq.heappush(heap, (-self._max_freq.get(next_state.value, 0),
+                                next_term, 1, next_state))
+    return terms
+
   def _read_prefix(self, prefix: str) -> Union[State, None]:
     """Finds the states for the given prefix
 
@@ -340,8 +745,9 @@ class Trie(FSM):
       if len(next_states) == 0: # If no transition then return immediately
         return None
       if len(next_states) > 1:
-        FSMException('Encountered multiple states for state {}, symbol {}, '
-                     'next: {}'.format(state, character, next_states))
+        raise FSMException('Encountered multiple states for state {}, '
+                           'symbol {}, next: {}'.format(state, character,
+                                                        next_states))
       else:
         state = next(iter(next_states))
     return state
@@ -352,8 +758,10 @@ def main():
   dict_entries = ['zha', 'zhang', 'zhan', 'zhao', 'fang']
   trie.build(dict_entries)
   prefix = 'zh'
-  terms = trie.find_with_prefix(prefix)
+  terms = trie.find_with_prefix(prefix, ordered=True)
   print('Prefix {} has terms {}'.format(prefix, terms))
+  trie.set_frequencies({'zha': 5, 'zhang': 20, 'zhan': 8, 'zhao': 12})
+  print('Top 2: {}'.format(trie.top_k(prefix, 2)))
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Benchmarks for the prefix structures built from the dictionary keys.
+
+Builds a trie, a minimal automaton (DAWG) and a memory mapped double-array trie
+from the full dictionary key set, comparing their memory use with a Python set
+and measuring the latency of prefix completion for prefixes sampled from the
+keys. Given term frequencies, it also measures frequency-ranked top-k
+completion. Levenshtein lookup with the trie and a BK-tree is compared with a
+linear scan of the keys. The results are written as JSON, in the same way as
+the tokenizer benchmarks.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Union
+
+from chinesenotes import benchmark
+from chinesenotes import mutualinfo
+from chinesenotes import similarity
+from chinesenotes.bktree import BKTree
+from chinesenotes.datrie import DoubleArrayTrie
+from chinesenotes.dawg import Dawg
+from chinesenotes.trie import CompiledFSM, Trie
+
+FREQ_FILE_DEF = 'data/corpus/analysis/term_freq.tsv'
+FUZZY_QUERIES_DEF = 20
+NUM_PREFIXES_DEF = 1000
+OUTFILE_DEF = 'trie_benchmark.json'
+TOP_K_DEF = 10
+
+
+def benchmark_datrie(keys: List[str],
+                     prefix_sets: Dict[int, List[str]],
+                     limit: int = None) -> dict:
+  """Builds, saves and memory maps a double-array trie and times prefix
+  completion
+
+  Args:
+    keys: the dictionary keys
+    prefix_sets: the prefixes to complete, keyed by prefix length
+    limit: the maximum number of completions per prefix
+  Returns:
+    A dictionary of results
+  """
+  datrie = DoubleArrayTrie()
+  t0 = time.perf_counter()
+  datrie.build(keys)
+  build_seconds = time.perf_counter() - t0
+  with tempfile.TemporaryDirectory() as dname:
+    fname = os.path.join(dname, 'keys.da')
+    datrie.save(fname)
+    file_bytes = os.path.getsize(fname)
+    datrie = DoubleArrayTrie()
+    t0 = time.perf_counter()
+    datrie.load(fname)
+    load_seconds = time.perf_counter() - t0
+    size = datrie.size
+    results = {}
+    for length, prefixes in prefix_sets.items():
+      logging.info(f'Benchmarking double-array prefix_len_{length}')
+      results[f'prefix_len_{length}'] = benchmark_prefixes(datrie, prefixes,
+                                                           limit)
+    datrie.close()
+  return {
+    'size': size,
+    'build_seconds': build_seconds,
+    'file_bytes': file_bytes,
+    'load_seconds': load_seconds,
+    'results': results,
+  }
+
+
+def benchmark_fuzzy(trie: Trie, queries: List[str], max_dist: int) -> dict:
+  """Times fuzzy lookup on the trie, counting the transitions followed
+
+  Args:
+    trie: the trie to query
+    queries: the strings to match
+    max_dist: the maximum Levenshtein distance
+  Returns:
+    A dictionary of results
+  """
+  latencies = []
+  matches = 0
+  visited = 0
+  for query in queries:
+    t0 = time.perf_counter()
+    terms, num_visited = trie.fuzzy_walk(query, max_dist)
+    latencies.append(time.perf_counter() - t0)
+    matches += len(terms)
+    visited += num_visited
+  return {
+    'queries': len(queries),
+    'matches': matches,
+    'mean_transitions_visited': visited / len(queries) if queries else 0.0,
+    'seconds': sum(latencies),
+    'p50_latency_ms': benchmark.percentile(latencies, 50) * 1000,
+    'p99_latency_ms': benchmark.percentile(latencies, 99) * 1000,
+  }
+
+
+def benchmark_full_scan(keys: List[str], queries: List[str]) -> dict:
+  """Times computing the Levenshtein distance of each query to every key"""
+  latencies = []
+  for query in queries:
+    t0 = time.perf_counter()
+    for key in keys:
+      similarity.levenshtein_distance(query, key)
+    latencies.append(time.perf_counter() - t0)
+  return {
+    'queries': len(queries),
+    'keys_scanned': len(keys),
+    'seconds': sum(latencies),
+    'p50_latency_ms': benchmark.percentile(latencies, 50) * 1000,
+    'p99_latency_ms': benchmark.percentile(latencies, 99) * 1000,
+  }
+
+
+def benchmark_bktree(keys: List[str], queries: List[str],
+                     tree_file: str = None) -> dict:
+  """Times radius and nearest neighbor queries on a BK-tree
+
+  The number of nodes visited, each needing one edit distance, is reported
+  with the number of keys that a linear scan would compare.
+
+  Args:
+    keys: the dictionary keys
+    queries: the strings to match
+    tree_file: a saved tree to load, or to save the tree built to if the file
+      does not exist
+  Returns:
+    A dictionary of results
+  """
+  t0 = time.perf_counter()
+  if tree_file and os.path.exists(tree_file):
+    tree = BKTree.load(tree_file)
+  else:
+    tree = BKTree()
+    tree.build(keys)
+    if tree_file:
+      tree.save(tree_file)
+  results = {
+    'nodes': len(tree),
+    'load_or_build_seconds': time.perf_counter() - t0,
+    'linear_scan_comparisons': len(keys),
+  }
+  searches = [(f'radius_{radius}', tree.search_within, radius)
+              for radius in (1, 2)]
+  searches.append((f'nearest_{TOP_K_DEF}', tree.search_nearest, TOP_K_DEF))
+  for name, search, param in searches:
+    logging.info(f'Benchmarking bktree {name}')
+    latencies = []
+    matches = 0
+    visited = 0
+    for query in queries:
+      t0 = time.perf_counter()
+      found, num_visited = search(query, param)
+      latencies.append(time.perf_counter() - t0)
+      matches += len(found)
+      visited += num_visited
+    results[name] = {
+      'queries': len(queries),
+      'matches': matches,
+      'mean_nodes_visited': visited / len(queries) if queries else 0.0,
+      'seconds': sum(latencies),
+      'p50_latency_ms': benchmark.percentile(latencies, 50) * 1000,
+      'p99_latency_ms': benchmark.percentile(latencies, 99) * 1000,
+    }
+  return results
+
+
+def benchmark_prefixes(trie: Union[Trie, Dawg, DoubleArrayTrie],
+                       prefixes: List[str],
+                       limit: int = None,
+                       ordered: bool = False) -> dict:
+  """Times prefix completion for each of the prefixes
+
+  Args:
+    trie: the trie to query
+    prefixes: the prefixes to complete
+    limit: the maximum number of completions per prefix
+    ordered: whether to return completions in lexicographic order, a DAWG and
+      a double-array trie always do
+  Returns:
+    A dictionary of results
+  """
+  latencies = []
+  completions = 0
+  for prefix in prefixes:
+    t0 = time.perf_counter()
+    if ordered:
+      completions += len(trie.find_with_prefix(prefix, limit, ordered))
+    else:
+      completions += len(trie.find_with_prefix(prefix, limit))
+    latencies.append(time.perf_counter() - t0)
+  return {
+    'prefixes': len(prefixes),
+    'completions': completions,
+    'seconds': sum(latencies),
+    'p50_latency_ms': benchmark.percentile(latencies, 50) * 1000,
+    'p99_latency_ms': benchmark.percentile(latencies, 99) * 1000,
+  }
+
+
+def benchmark_top_k(trie: Trie, prefixes: List[str], k: int) -> dict:
+  """Times frequency-ranked top-k completion for each of the prefixes"""
+  latencies = []
+  completions = 0
+  for prefix in prefixes:
+    t0 = time.perf_counter()
+    completions += len(trie.top_k(prefix, k))
+    latencies.append(time.perf_counter() - t0)
+  return {
+    'prefixes': len(prefixes),
+    'completions': completions,
+    'seconds': sum(latencies),
+    'p50_latency_ms': benchmark.percentile(latencies, 50) * 1000,
+    'p99_latency_ms': benchmark.percentile(latencies, 99) * 1000,
+  }
+
+
+def benchmark_recognize(fsm: Union[Trie, CompiledFSM],
+                        words: List[str]) -> dict:
+  """Times recognizing each of the words"""
+  t0 = time.perf_counter()
+  recognized = sum(1 for word in words if fsm.recognizes(word))
+  elapsed = time.perf_counter() - t0
+  return {
+    'words': len(words),
+    'recognized': recognized,
+    'seconds': elapsed,
+    'words_per_sec': len(words) / elapsed if elapsed else 0.0,
+  }
+
+
+def measure_memory(keys: List[str]) -> dict:
+  """Measures the memory retained by each structure built from the keys
+
+  The keys themselves are allocated before tracing starts, so only the
+  memory of the structure, including any copies of the key strings, is
+  counted.
+
+  Args:
+    keys: the dictionary keys
+  Returns:
+    A dictionary of bytes retained, keyed by structure
+  """
+  results = {}
+  for name in ('set', 'trie', 'dawg'):
+    logging.info(f'Measuring memory of {name}')
+    tracemalloc.start()
+    structure = _build_structure(name, keys)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results[name] = current
+    del structure
+  return results
+
+
+def sample_prefixes(keys: List[str],
+                    num_prefixes: int,
+                    length: int,
+                    seed: int = 0) -> List[str]:
+  """Samples prefixes of the given length from the dictionary keys"""
+  rand = random.Random(seed)
+  candidates = sorted({key[:length] for key in keys if len(key) >= length})
+  if len(candidates) <= num_prefixes:
+    return candidates
+  return rand.sample(candidates, num_prefixes)
+
+
+def run(keys: List[str],
+        num_prefixes: int,
+        limit: int = None,
+        freq: Dict[str, int] = None,
+        k: int = TOP_K_DEF,
+        fuzzy_queries: int = FUZZY_QUERIES_DEF,
+        bktree_file: str = None) -> dict:
+  """Builds a trie from the keys and benchmarks prefix completion
+
+  Args:
+    keys: the dictionary keys
+    num_prefixes: the number of prefixes of each length to sample
+    limit: the maximum number of completions per prefix
+    freq: term frequencies for top-k completion, skipped if not given
+    k: the number of completions for top-k completion
+    fuzzy_queries: the number of keys to use as fuzzy lookup queries
+    bktree_file: a saved BK-tree to load, or to save the tree built to
+  Returns:
+    A dictionary of results
+  """
+  trie = Trie()
+  t0 = time.perf_counter()
+  trie.build(keys)
+  build_seconds = time.perf_counter() - t0
+  logging.info(f'Built trie with {len(trie.states)} states in '
+               f'{build_seconds:.2f} s')
+  sorted_keys = sorted(keys)
+  t0 = time.perf_counter()
+  Trie().build_sorted(sorted_keys)
+  build_sorted_seconds = time.perf_counter() - t0
+  logging.info(f'Built trie from sorted keys in {build_sorted_seconds:.2f} s')
+  prefix_sets = {length: sample_prefixes(keys, num_prefixes, length)
+                 for length in (1, 2)}
+  results = {}
+  for length, prefixes in prefix_sets.items():
+    for ordered in (False, True):
+      name = f'prefix_len_{length}' + ('_ordered' if ordered else '')
+      logging.info(f'Benchmarking {name}')
+      results[name] = benchmark_prefixes(trie, prefixes, limit, ordered)
+  t0 = time.perf_counter()
+  compiled = trie.compile()
+  compile_seconds = time.perf_counter() - t0
+  logging.info(f'Compiled trie to {compiled.size} slots in '
+               f'{compile_seconds:.2f} s')
+  for name, fsm in (('recognize', trie), ('recognize_compiled', compiled)):
+    logging.info(f'Benchmarking {name}')
+    results[name] = benchmark_recognize(fsm, keys)
+  queries = random.Random(0).sample(keys, min(fuzzy_queries, len(keys)))
+  for max_dist in (1, 2):
+    name = f'fuzzy_k_{max_dist}'
+    logging.info(f'Benchmarking {name}')
+    results[name] = benchmark_fuzzy(trie, queries, max_dist)
+  logging.info('Benchmarking fuzzy_full_scan')
+  results['fuzzy_full_scan'] = benchmark_full_scan(keys, queries)
+  results['bktree'] = benchmark_bktree(keys, queries, bktree_file)
+  dawg = Dawg()
+  t0 = time.perf_counter()
+  dawg.build(keys)
+  dawg_build_seconds = time.perf_counter() - t0
+  for length, prefixes in prefix_sets.items():
+    name = f'dawg_prefix_len_{length}'
+    logging.info(f'Benchmarking {name}')
+    results[name] = benchmark_prefixes(dawg, prefixes, limit)
+  if freq:
+    trie.set_frequencies(freq)
+    for length, prefixes in prefix_sets.items():
+      name = f'top_{k}_prefix_len_{length}'
+      logging.info(f'Benchmarking {name}')
+      results[name] = benchmark_top_k(trie, prefixes, k)
+  return {
+    'python': platform.python_version(),
+    'keys': len(keys),
+    'states': len(trie.states),
+    'build_seconds': build_seconds,
+    'build_sorted_seconds': build_sorted_seconds,
+    'compile_seconds': compile_seconds,
+    'compiled_size': compiled.size,
+    'dawg_nodes': dawg.num_nodes,
+    'dawg_edges': dawg.num_edges,
+    'dawg_build_seconds': dawg_build_seconds,
+    'limit': limit,
+    'memory_bytes': measure_memory(keys),
+    'results': results,
+    'double_array': benchmark_datrie(keys, prefix_sets, limit),
+  }
+
+
+def _build_structure(name: str, keys: List[str]) -> Union[set, Trie, Dawg]:
+  """Builds a set, trie or minimal automaton from the keys"""
+  if name == 'set':
+    return set(keys)
+  structure = Trie() if name == 'trie' else Dawg()
+  structure.build(keys)
+  return structure
+
+
+def main():
+  """Command line entry point"""
+  logging.basicConfig(level=logging.INFO)
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--dict_file',
+                      dest='dict_file',
+                      help='Dictionary file to load, if not Chinese Notes')
+  parser.add_argument('--num_prefixes',
+                      dest='num_prefixes',
+                      type=int,
+                      default=NUM_PREFIXES_DEF,
+                      help='Number of prefixes of each length to sample')
+  parser.add_argument('--limit',
+                      dest='limit',
+                      type=int,
+                      help='Maximum number of completions per prefix')
+  parser.add_argument('--freq_file',
+                      dest='freq_file',
+                      default=FREQ_FILE_DEF,
+                      help='Term frequency file for top-k completion')
+  parser.add_argument('--doc_freq',
+                      dest='doc_freq',
+                      action='store_true',
+                      help='Frequency file is a document frequency file')
+  parser.add_argument('--top_k',
+                      dest='top_k',
+                      type=int,
+                      default=TOP_K_DEF,
+                      help='Number of completions for top-k completion')
+  parser.add_argument('--fuzzy_queries',
+                      dest='fuzzy_queries',
+                      type=int,
+                      default=FUZZY_QUERIES_DEF,
+                      help='Number of queries for fuzzy lookup')
+  parser.add_argument('--bktree_file',
+                      dest='bktree_file',
+                      help='Saved BK-tree to load, or to save the tree to')
+  parser.add_argument('--outfile',
+                      dest='outfile',
+                      default=OUTFILE_DEF,
+                      help='File name to write JSON results to')
+  args = parser.parse_args()
+  wdict = benchmark.load_dictionary(args.dict_file)
+  freq = None
+  if args.freq_file and os.path.exists(args.freq_file):
+    if args.doc_freq:
+      freq, _ = mutualinfo.load_doc_freq(args.freq_file)
+    else:
+      freq, _ = mutualinfo.load_freq(args.freq_file)
+  results = run(list(wdict), args.num_prefixes, args.limit, freq, args.top_k,
+                args.fuzzy_queries, args.bktree_file)
+  with open(args.outfile, 'w', encoding='utf-8') as f:
+    json.dump(results, f, ensure_ascii=False, indent=2)
+  logging.info(f'Benchmark results written to {args.outfile}')
+
+
+# Entry point from a script
+if __name__ == '__main__':
+  main()
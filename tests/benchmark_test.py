@@ -0,0 +1,85 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.benchmark
+"""
+
+import unittest
+
+from chinesenotes import benchmark
+from chinesenotes.cndict_types import DictionaryEntry, WordSense
+
+WORDS = ['東家', '西家', '人', '死', '助', '哀']
+
+
+def make_dict():
+  return {word: DictionaryEntry(word, [WordSense(word, '\\N', '', '')], str(i))
+          for i, word in enumerate(WORDS)}
+
+
+class BenchmarkTest(unittest.TestCase):
+
+  def test_percentile_empty(self):
+    self.assertEqual(benchmark.percentile([], 50), 0.0)
+
+  def test_percentile_median(self):
+    self.assertEqual(benchmark.percentile([5, 1, 4, 2, 3], 50), 3)
+    self.assertEqual(benchmark.percentile([4, 1, 3, 2], 50), 2)
+
+  def test_percentile_p99(self):
+    values = list(range(1, 101))
+    self.assertEqual(benchmark.percentile(values, 99), 99)
+    self.assertEqual(benchmark.percentile([1, 2, 3], 99), 3)
+    self.assertEqual(benchmark.percentile([7], 99), 7)
+
+  def test_percentile_bounds(self):
+    self.assertEqual(benchmark.percentile([3, 1, 2], 0), 1)
+    self.assertEqual(benchmark.percentile([3, 1, 2], 100), 3)
+
+  def test_synthetic_sentences_seed(self):
+    wdict = make_dict()
+    first = benchmark.synthetic_sentences(wdict, 200, seed=1)
+    self.assertListEqual(benchmark.synthetic_sentences(wdict, 200, seed=1),
+                         first)
+    self.assertNotEqual(benchmark.synthetic_sentences(wdict, 200, seed=2),
+                        first)
+
+  def test_synthetic_sentences_size(self):
+    """Stops with the first sentence reaching the size"""
+    sentences = benchmark.synthetic_sentences(make_dict(), 200)
+    total = sum(len(sentence) for sentence in sentences)
+    self.assertGreaterEqual(total, 200)
+    self.assertLess(total - len(sentences[-1]), 200)
+    for sentence in sentences:
+      self.assertIn(sentence[-1], '。，；')
+    self.assertListEqual(benchmark.synthetic_sentences({}, 200), [])
+
+  def test_run(self):
+    results = benchmark.run(make_dict(), [], 100,
+                            ['tokenize_greedy', 'tokenize_stream'])
+    self.assertEqual(results['dictionary_size'], len(WORDS))
+    self.assertListEqual(list(results['results']), ['synthetic'])
+    for name in ['tokenize_greedy', 'tokenize_stream']:
+      result = results['results']['synthetic'][name]
+      self.assertGreaterEqual(result['chars'], 100)
+      self.assertGreater(result['tokens'], 0)
+    self.assertNotIn('tokenize_many', results)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,92 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.bktree
+"""
+
+import os
+import tempfile
+import unittest
+
+from chinesenotes import bktree
+from chinesenotes import similarity
+
+WORDS = ['中国', '中国人', '美国', '国家', '中文', '大学', '中国人民大学', '国',
+         '人民', '人']
+
+
+class BKTreeTest(unittest.TestCase):
+
+  def test_edit_distance(self):
+    """Same distances as the dynamic programming version"""
+    pairs = [('', ''), ('', '中国'), ('中国', ''), ('中国', '中国人'),
+             ('中国人', '美国'), ('kitten', 'sitting'), ('abcabc', 'cbacba'),
+             ('x' * 70 + 'ab', 'y' + 'x' * 70 + 'b')]
+    for w1, w2 in pairs:
+      self.assertEqual(bktree.edit_distance(w1, w2),
+                       similarity.levenshtein_distance(w1, w2), (w1, w2))
+
+  def test_find_within(self):
+    tree = bktree.BKTree()
+    tree.build(WORDS)
+    self.assertListEqual(tree.find_within('中國', 1),
+                         [('中国', 1), ('中文', 1)])
+    self.assertListEqual(tree.find_within('中国人', 1),
+                         [('中国人', 0), ('中国', 1)])
+    expected = sorted(((w, similarity.levenshtein_distance('大國', w))
+                       for w in WORDS), key=lambda x: (x[1], x[0]))
+    self.assertListEqual(tree.find_within('大國', 2),
+                         [x for x in expected if x[1] <= 2])
+
+  def test_find_nearest(self):
+    tree = bktree.BKTree()
+    tree.build(WORDS)
+    self.assertListEqual(tree.find_nearest('中国人', 3),
+                         [('中国人', 0), ('中国', 1), ('中文', 2)])
+    self.assertListEqual(tree.find_nearest('中国人', 0), [])
+
+  def test_search_visited(self):
+    """Same results as the find methods, visiting no more than every node"""
+    tree = bktree.BKTree()
+    tree.build(WORDS)
+    found, visited = tree.search_within('中國', 1)
+    self.assertListEqual(found, tree.find_within('中國', 1))
+    self.assertTrue(0 < visited <= len(tree))
+    found, visited = tree.search_nearest('中国人', 3)
+    self.assertListEqual(found, tree.find_nearest('中国人', 3))
+    self.assertTrue(0 < visited <= len(tree))
+
+  def test_duplicates(self):
+    tree = bktree.BKTree()
+    tree.build(['中国', '中国'])
+    self.assertEqual(len(tree), 1)
+
+  def test_save_load(self):
+    tree = bktree.BKTree()
+    tree.build(WORDS)
+    with tempfile.TemporaryDirectory() as tmp:
+      fname = os.path.join(tmp, 'bktree.tsv')
+      tree.save(fname)
+      loaded = bktree.BKTree.load(fname)
+    self.assertEqual(len(loaded), len(WORDS))
+    self.assertListEqual(loaded.find_within('中國', 2),
+                         tree.find_within('中國', 2))
+
+
+if __name__ == '__main__':
+  unittest.main()
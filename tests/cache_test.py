@@ -0,0 +1,68 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.cache
+"""
+
+import unittest
+
+from chinesenotes import cache
+
+class LRUCacheTest(unittest.TestCase):
+
+  def test_eviction(self):
+    """The least recently used entry is evicted"""
+    lru = cache.LRUCache(2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    self.assertEqual(lru.get('a'), 1)
+    lru.put('c', 3)
+    self.assertNotIn('b', lru)
+    self.assertIn('a', lru)
+    self.assertEqual(lru.evictions, 1)
+
+  def test_counters(self):
+    """Hits and misses are counted"""
+    lru = cache.LRUCache(2)
+    lru.put('a', 1)
+    lru.get('a')
+    lru.get('b')
+    self.assertEqual(lru.hits, 1)
+    self.assertEqual(lru.misses, 1)
+
+  def test_ttl(self):
+    """Entries expire after their time to live"""
+    now = [0.0]
+    lru = cache.LRUCache(2, ttl=10, timer=lambda: now[0])
+    lru.put('a', 1)
+    now[0] = 5.0
+    self.assertEqual(lru.get('a'), 1)
+    now[0] = 10.0
+    self.assertNotIn('a', lru)
+    self.assertIsNone(lru.get('a'))
+    self.assertEqual(lru.expirations, 1)
+    self.assertEqual(lru.misses, 1)
+    self.assertEqual(len(lru), 0)
+
+  def test_bad_ttl(self):
+    with self.assertRaises(ValueError):
+      cache.LRUCache(2, ttl=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,6 +26,17 @@ from chinesenotes import cndict
 
 class TestCNDict(unittest.TestCase):
 
+  def test_cached_tokenizer(self):
+    """A repeated chunk is served from the cache"""
+    wdict = {'東家': None}
+    tokenizer = cndict.CachedTokenizer(wdict, maxsize=10)
+    first = tokenizer.tokenize('東家人死。')
+    second = tokenizer.tokenize('東家人死。')
+    self.assertEqual(first, ('東家', '人', '死', '。'))
+    self.assertIs(first, second)
+    self.assertEqual(tokenizer.cache.hits, 1)
+    self.assertEqual(tokenizer.cache.misses, 1)
+
   def test_greedy(self):
     """Empty dictionary"""
     trad = '四種廣說'
@@ -33,6 +44,67 @@ class TestCNDict(unittest.TestCase):
     segments = cndict.tokenize_greedy(wdict, trad)
     self.assertEqual(len(segments), len(trad))
 
+  def test_tokenize_filtered(self):
+    """A rejected two-character term is split into characters"""
+    wdict = {'東家': None, '西家': None}
+    segments = cndict.tokenize_filtered(wdict, '東家西家', {'西家'})
+    self.assertEqual(segments, ['東家', '西', '家'])
+
+  def test_tokenize_stream(self):
+    """Terms spanning a line break are still found"""
+    wdict = {'東家': None, '西家': None, '家人': None}
+    lines = ['東家人死。西\n', '家人助哀。\n']
+    segments = list(cndict.tokenize_stream(wdict, lines))
+    expected = cndict.tokenize_greedy(wdict, '東家人死。西家人助哀。')
+    self.assertEqual(segments, expected)
+    self.assertIn('西家', segments)
+
+  def test_tokenize_stream_blocks(self):
+    """A file without line breaks is read a block at a time"""
+    wdict = {'東家': None, '西家': None, '家人': None}
+    chunk = '東家人死。西家人助哀。' * 100
+    sizes = []
+
+    class Reader(io.StringIO):
+      def read(self, size=-1):
+        sizes.append(size)
+        return super().read(size)
+
+    segments = list(cndict.tokenize_stream(wdict, Reader(chunk)))
+    self.assertEqual(segments, cndict.tokenize_greedy(wdict, chunk))
+    self.assertEqual(set(sizes), {cndict.STREAM_BLOCK_TERMS * 2})
+    segments = list(cndict.tokenize_stream(wdict, [chunk]))
+    self.assertEqual(segments, cndict.tokenize_greedy(wdict, chunk))
+
+  def test_tokenize_stream_empty(self):
+    """No input gives no tokens"""
+    segments = list(cndict.tokenize_stream({}, []))
+    self.assertEqual(segments, [])
+
+  def test_split_sentences(self):
+    """Punctuation stays with the preceding sentence"""
+    chunk = '東家人死，西家人助哀。好'
+    sentences = cndict.split_sentences(chunk)
+    self.assertEqual(sentences, ['東家人死，', '西家人助哀。', '好'])
+    self.assertEqual(''.join(sentences), chunk)
+
+  def test_tokenize_many(self):
+    """Results come back in the same order as the texts"""
+    wdict = {'東家': None, '西家': None}
+    texts = ['東家人死。西家人助哀。', '', '西家；東家']
+    results = cndict.tokenize_many(wdict, texts, processes=2, chunksize=1)
+    expected = [cndict.tokenize_greedy(wdict, text) for text in texts]
+    self.assertEqual(results, expected)
+
+  def test_greedy_skip_non_cjk(self):
+    """Non-CJK runs are split at whitespace and not looked up"""
+    wdict = {'東家': None, 'Di': None}
+    chunk = 'The Di said, 東家人死。 <b>12</b>'
+    segments = cndict.tokenize_greedy(wdict, chunk, skip_non_cjk=True)
+    self.assertEqual(segments, ['The', ' ', 'Di', ' ', 'said,', ' ', '東家',
+                                '人', '死', '。', ' ', '<b>12</b>'])
+    self.assertEqual(''.join(segments), chunk)
+
   def test_load_dictionary0(self):
     """Empty dictionary"""
     trad = '說'
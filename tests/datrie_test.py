@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.datrie
+"""
+
+import os
+import tempfile
+import unittest
+
+from chinesenotes import datrie
+
+DICT_ENTRIES = ['zha', 'zhang', 'zhan', 'zhao', 'fang', '中', '中国', '國家']
+
+class DoubleArrayTrieTest(unittest.TestCase):
+
+  def setUp(self):
+    self.trie = datrie.DoubleArrayTrie()
+    self.trie.build(DICT_ENTRIES)
+
+  def test_contains(self):
+    """Keys are found and prefixes that are not keys are not"""
+    self.assertEqual(len(self.trie), len(DICT_ENTRIES))
+    for key in DICT_ENTRIES:
+      self.assertIn(key, self.trie)
+    self.assertNotIn('zh', self.trie)
+    self.assertNotIn('國', self.trie)
+    self.assertNotIn('zhangs', self.trie)
+
+  def test_find_with_prefix(self):
+    """Completions in lexicographic order, up to the limit"""
+    self.assertEqual(self.trie.find_with_prefix('zh'),
+                     ['zha', 'zhan', 'zhang', 'zhao'])
+    self.assertEqual(self.trie.find_with_prefix('zh', limit=2),
+                     ['zha', 'zhan'])
+    self.assertEqual(self.trie.find_with_prefix('中'), ['中', '中国'])
+    self.assertEqual(self.trie.find_with_prefix('x'), [])
+
+  def test_longest_prefix(self):
+    """The length of the longest key at the start position"""
+    self.assertEqual(self.trie.longest_prefix('中国人'), 2)
+    self.assertEqual(self.trie.longest_prefix('我中国', 1), 2)
+    self.assertEqual(self.trie.longest_prefix('國人'), 0)
+    self.assertEqual(self.trie.longest_prefix('zhangs'), 5)
+
+  def test_save_load(self):
+    """A memory mapped trie gives the same results as the one saved"""
+    with tempfile.TemporaryDirectory() as dname:
+      fname = os.path.join(dname, 'keys.da')
+      self.trie.save(fname)
+      loaded = datrie.DoubleArrayTrie()
+      loaded.load(fname)
+      self.assertEqual(len(loaded), len(DICT_ENTRIES))
+      self.assertEqual(loaded.size, self.trie.size)
+      self.assertIn('國家', loaded)
+      self.assertEqual(loaded.find_with_prefix('zh'),
+                       ['zha', 'zhan', 'zhang', 'zhao'])
+      loaded.close()
+
+  def test_load_invalid(self):
+    """Loading a file that is not a trie file raises an exception"""
+    with tempfile.TemporaryDirectory() as dname:
+      fname = os.path.join(dname, 'keys.da')
+      with open(fname, 'wb') as f:
+        f.write(b'not a trie file at all')
+      with self.assertRaises(datrie.DoubleArrayException):
+        datrie.DoubleArrayTrie().load(fname)
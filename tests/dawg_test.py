@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.dawg
+"""
+
+import unittest
+
+from chinesenotes import dawg
+
+DICT_ENTRIES = ['zha', 'zhang', 'zhan', 'zhao', 'fang', '南山', '北山', '中山',
+                '大县', '大縣']
+
+class DawgTest(unittest.TestCase):
+
+  def setUp(self):
+    self.dawg = dawg.Dawg()
+    self.dawg.build(DICT_ENTRIES)
+
+  def test_contains(self):
+    """Keys are found and prefixes that are not keys are not"""
+    self.assertEqual(len(self.dawg), len(DICT_ENTRIES))
+    for key in DICT_ENTRIES:
+      self.assertIn(key, self.dawg)
+    self.assertNotIn('zh', self.dawg)
+    self.assertNotIn('山', self.dawg)
+    self.assertNotIn('西山', self.dawg)
+
+  def test_find_with_prefix(self):
+    """Completions in lexicographic order, up to the limit"""
+    self.assertEqual(self.dawg.find_with_prefix('zh'),
+                     ['zha', 'zhan', 'zhang', 'zhao'])
+    self.assertEqual(self.dawg.find_with_prefix('zh', limit=2),
+                     ['zha', 'zhan'])
+    self.assertEqual(self.dawg.find_with_prefix('大'), ['大县', '大縣'])
+    self.assertEqual(self.dawg.find_with_prefix('x'), [])
+
+  def test_shared_suffixes(self):
+    """Keys ending in the same suffix share states"""
+    d = dawg.Dawg()
+    d.build(['南山', '北山', '中山'])
+    # Root, the state after the first character and the final state
+    self.assertEqual(d.num_nodes, 3)
+    self.assertEqual(d.num_edges, 4)
+
+  def test_add_out_of_order(self):
+    """Adding keys out of order raises an exception"""
+    d = dawg.Dawg()
+    d.add('zhang')
+    with self.assertRaises(dawg.DawgException):
+      d.add('zha')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.minhash
+"""
+
+import unittest
+
+from chinesenotes import minhash
+from chinesenotes import similarity
+from chinesenotes.cndict_types import DictionaryEntry, WordSense
+
+PHRASES = ['中国人民', '中国人', '美国人', '中国人民大学', '大学', '国',
+           '天下大乱', '春秋左传']
+
+
+def make_dict(keys):
+  return {key: DictionaryEntry(key, [WordSense(key, '\\N', '', '')], str(i))
+          for i, key in enumerate(keys)}
+
+
+class MinHashTest(unittest.TestCase):
+
+  def test_shingles(self):
+    self.assertEqual(minhash.shingles('中国人'), {'中国', '国人'})
+    self.assertEqual(minhash.shingles('国'), {'国'})
+    self.assertEqual(minhash.shingles('中国人', 1), {'中', '国', '人'})
+
+  def test_jaccard(self):
+    self.assertEqual(minhash.jaccard({'a', 'b'}, {'b', 'c'}), 1 / 3)
+    self.assertEqual(minhash.jaccard(set(), set()), 0.0)
+
+  def test_bad_parameters(self):
+    with self.assertRaises(ValueError):
+      minhash.MinHashIndex(bands=0)
+    with self.assertRaises(ValueError):
+      minhash.MinHashIndex(n=0)
+
+  def test_add(self):
+    index = minhash.MinHashIndex()
+    index.add(PHRASES + ['中国人', ''])
+    self.assertEqual(len(index), len(PHRASES))
+    self.assertEqual(index.phrases, PHRASES)
+
+  def test_signatures(self):
+    """Equal shingle sets have equal signatures"""
+    index = minhash.MinHashIndex(bands=4, rows=2)
+    signatures = index.signatures(['中国人', '中国人', '美国'])
+    self.assertEqual(signatures.shape, (3, 8))
+    self.assertEqual(list(signatures[0]), list(signatures[1]))
+    self.assertNotEqual(list(signatures[0]), list(signatures[2]))
+
+  def test_candidates(self):
+    """A phrase is always a candidate for itself"""
+    index = minhash.MinHashIndex()
+    index.add(PHRASES)
+    for i, phrase in enumerate(PHRASES):
+      self.assertIn(i, index.candidates(phrase))
+    self.assertEqual(index.candidates(''), set())
+
+  def test_find_similar(self):
+    index = minhash.MinHashIndex(bands=64, rows=1)
+    index.add(PHRASES)
+    results = index.find_similar('中国人民', 2)
+    self.assertEqual(results[0], ('中国人', 2 / 3))
+    self.assertEqual([phrase for phrase, _ in results],
+                     ['中国人', '中国人民大学'])
+    similarities = [sim for _, sim in results]
+    self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+  def test_measure_recall(self):
+    index = minhash.MinHashIndex(bands=64, rows=1, n=1)
+    index.add(PHRASES)
+    sim_index = similarity.SimilarityIndex(make_dict(PHRASES))
+    results = minhash.measure_recall(index, sim_index, ['中国人', '大学'])
+    self.assertEqual(results['queries'], 2)
+    self.assertGreater(results['mean_recall'], 0.0)
+    self.assertLessEqual(results['mean_recall'], 1.0)
+    self.assertGreater(results['mean_candidates'], 0.0)
+
+  def test_measure_recall_excludes_query(self):
+    """A key is not a candidate for itself"""
+    index = minhash.MinHashIndex(bands=64, rows=1, n=1)
+    index.add(['中国人', '美国'])
+    sim_index = similarity.SimilarityIndex(make_dict(['中国人', '美国']))
+    results = minhash.measure_recall(index, sim_index, ['中国人'])
+    self.assertEqual(results['mean_candidates'], 1.0)
+    self.assertEqual(results['mean_recall'], 1.0)
+
+
+if __name__ == '__main__':
+  unittest.main()
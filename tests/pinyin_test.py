@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.pinyin
+"""
+
+import unittest
+
+from chinesenotes import pinyin
+
+class PinyinSegmenterTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.segmenter = pinyin.PinyinSegmenter()
+
+  def test_segmentations(self):
+    """Every valid segmentation, fewest syllables first"""
+    self.assertEqual(self.segmenter.segmentations('zhongguoren'),
+                     [('zhong', 'guo', 'ren'), ('zhong', 'gu', 'o', 'ren')])
+    self.assertEqual(self.segmenter.segmentations('xian'),
+                     [('xian',), ('xi', 'an')])
+
+  def test_limit(self):
+    """Only the best segmentations of a long query"""
+    query = 'xian' * 25
+    segmentations = self.segmenter.segmentations(query, limit=3)
+    self.assertEqual(segmentations,
+                     [('xian',) * 25, ('xi', 'an') + ('xian',) * 24,
+                      ('xian', 'xi', 'an') + ('xian',) * 23])
+    self.assertEqual(self.segmenter.segment(query), ('xian',) * 25)
+    self.assertEqual(len(self.segmenter.segmentations(query)),
+                     pinyin.SEGMENTATIONS_DEF)
+
+  def test_boundaries(self):
+    """Apostrophes and spaces separate syllables"""
+    self.assertEqual(self.segmenter.segmentations("xi'an"), [('xi', 'an')])
+    self.assertEqual(self.segmenter.segment('Zhong Guo'), ('zhong', 'guo'))
+
+  def test_tones(self):
+    """Syllables with tone marks and tone numbers"""
+    self.assertEqual(self.segmenter.segment('zhōngguó'), ('zhōng', 'guó'))
+    self.assertEqual(self.segmenter.segment('zhong1guo2'),
+                     ('zhong1', 'guo2'))
+    self.assertEqual(self.segmenter.segment('nǚrén'), ('nǚ', 'rén'))
+
+  def test_invalid(self):
+    """No segmentations for text that is not pinyin"""
+    self.assertEqual(self.segmenter.segmentations('qqq'), [])
+    self.assertEqual(self.segmenter.segment(''), ())
+
+  def test_cache(self):
+    """Repeated queries are answered from the cache"""
+    segmenter = pinyin.PinyinSegmenter(cache_size=2)
+    segmenter.segment('beijing')
+    segmenter.segment('beijing')
+    self.assertEqual(segmenter.cache.hits, 1)
+    self.assertEqual(segmenter.cache.misses, 1)
+
+  def test_encode(self):
+    """Encoded syllables of the segmentation with the fewest syllables"""
+    codes = self.segmenter.encode('Zhōngguó')
+    self.assertEqual([pinyin.decode_syllable(code) for code in codes],
+                     [('zh', 'ong', 1), ('g', 'uo', 2)])
+    self.assertEqual(self.segmenter.encode('zhong1 guo2'), codes)
+    self.assertEqual(len(self.segmenter.encode('xian')), 1)
+    self.assertEqual(self.segmenter.encode('qqq'), ())
+
+  def test_encode_erhua(self):
+    """A final r is dropped only if needed for a segmentation"""
+    self.assertEqual(self.segmenter.encode('wánr'),
+                     self.segmenter.encode('wán'))
+    self.assertEqual(len(self.segmenter.encode('huānger')), 2)
+    self.assertEqual(pinyin.decode_syllable(
+        self.segmenter.encode('huānger')[1]), ('', 'er', 5))
+
+  def test_split_syllable(self):
+    """Initial, final and tone of a syllable"""
+    self.assertEqual(pinyin.split_syllable('zhuāng'), ('zh', 'uang', 1))
+    self.assertEqual(pinyin.split_syllable('ér'), ('', 'er', 2))
+    self.assertEqual(pinyin.split_syllable('lv4'), ('l', 'ü', 4))
+    self.assertEqual(pinyin.split_syllable('de'), ('d', 'e', 5))
+
+  def test_encode_syllable(self):
+    """Tones are in the low bits of the code"""
+    code = pinyin.encode_syllable('mā')
+    self.assertEqual(code & ~pinyin.TONE_MASK,
+                     pinyin.encode_syllable('mǎ') & ~pinyin.TONE_MASK)
+    self.assertEqual(pinyin.decode_syllable(code), ('m', 'a', 1))
+    with self.assertRaises(ValueError):
+      pinyin.encode_syllable('qqq')
+
+  def test_tone_variants(self):
+    """Tone marks go on a or e, the o of ou, or else the last vowel"""
+    self.assertIn('hǎo', pinyin.tone_variants('hao'))
+    self.assertIn('dōu', pinyin.tone_variants('dou'))
+    self.assertIn('guǐ', pinyin.tone_variants('gui'))
+    self.assertIn('liù', pinyin.tone_variants('liu'))
+    self.assertIn('xie3', pinyin.tone_variants('xie'))
+
+
+if __name__ == '__main__':
+    unittest.main()
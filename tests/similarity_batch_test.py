@@ -0,0 +1,66 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.similarity_batch
+"""
+
+import unittest
+
+from chinesenotes import similarity
+from chinesenotes.similarity_batch import BatchScorer
+
+KEYS = ['中', '中国', '中国人', '人民', '大学', '中国人民大学', '人人', '国中',
+        '美国人', '出家人', '出家']
+
+
+class BatchScorerTest(unittest.TestCase):
+
+  def test_score(self):
+    """Same features as computed one key at a time"""
+    scorer = BatchScorer(KEYS)
+    for query in ['中国人', '出家唄', '国', '中国人民', '日本', '中中国人']:
+      hamming, unigram, substring = scorer.score(query)
+      for i, key in enumerate(scorer.keys):
+        matches = sum(a == b for a, b in zip(query, key))
+        self.assertEqual(hamming[i], max(len(query), len(key)) - matches)
+        self.assertEqual(unigram[i], similarity.num_same_chars(set(query),
+                                                               key))
+        self.assertEqual(substring[i], query in key or key in query)
+
+  def test_score_repeated_chars(self):
+    """A character repeated in the query or the key is counted once"""
+    scorer = BatchScorer(['人人', '人', '中国'])
+    _, unigram, _ = scorer.score('人人人')
+    self.assertListEqual(unigram.tolist(), [1, 1, 0])
+    _, unigram, _ = scorer.score('中中国')
+    self.assertListEqual(unigram.tolist(), [0, 0, 2])
+
+  def test_score_batch(self):
+    scorer = BatchScorer(KEYS)
+    queries = [query for query, _, _, _ in scorer.score_batch(['中国', '大学'])]
+    self.assertListEqual(queries, ['中国', '大学'])
+
+  def test_top(self):
+    scorer = BatchScorer(KEYS)
+    top = scorer.top('中国人', 2)
+    self.assertListEqual(top, [('中国人民大学', 3, 3, True),
+                               ('中国', 2, 1, True)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,292 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.similarity
+"""
+
+import csv
+import os
+import tempfile
+import unittest
+
+from chinesenotes import similarity
+from chinesenotes import similarity_batch
+from chinesenotes.cndict_types import DictionaryEntry, WordSense
+from chinesenotes.pinyin import PinyinSegmenter
+
+WORDS = [
+  ('中国', '中國', 'Zhōngguó'),
+  ('中国人', '中國人', 'Zhōngguórén'),
+  ('中文', '中文', 'Zhōngwén'),
+  ('美国', '美國', 'Měiguó'),
+  ('国家', '國家', 'guójiā'),
+  ('国', '國', 'guó'),
+  ('人', '人', 'rén'),
+  ('英国', '英國', 'Yīngguó'),
+  ('中心', '中心', 'zhōngxīn'),
+  ('忠心', '忠心', 'zhōngxīn'),
+  ('大人', '大人', 'dàrén'),
+]
+
+# A hand-built tree in the format exported by similarity_train
+MODEL = {
+  'feature_names': similarity.RELEVANCE_FEATURES,
+  'nodes': [
+    {'feature': 0, 'threshold': 2.5, 'left': 1, 'right': 2, 'relevance': 0.2},
+    {'feature': -2, 'threshold': -2.0, 'left': -1, 'right': -1,
+     'relevance': 0.1},
+    {'feature': 1, 'threshold': 9.5, 'left': 3, 'right': 4, 'relevance': 0.6},
+    {'feature': -2, 'threshold': -2.0, 'left': -1, 'right': -1,
+     'relevance': 0.7},
+    {'feature': -2, 'threshold': -2.0, 'left': -1, 'right': -1,
+     'relevance': 0.3},
+  ],
+}
+
+
+def make_dict():
+  wdict = {}
+  for i, (simplified, traditional, pinyin) in enumerate(WORDS):
+    sense = WordSense(simplified, traditional, pinyin, '')
+    wdict[simplified] = DictionaryEntry(simplified, [sense], str(i))
+  # Traditional form of an entry, which has the same simplified form
+  sense = WordSense('中国', '中國', 'Zhōngguó', '')
+  wdict['中國'] = DictionaryEntry('中國', [sense], '0')
+  return wdict
+
+
+class SimilarityIndexTest(unittest.TestCase):
+
+  def test_find_similar(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    for w in wdict:
+      expected = similarity.find_similar(w, wdict)
+      result = index.find_similar(w)
+      self.assertSetEqual(set(expected), set(result), w)
+
+  def test_find_similar_index(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    result = similarity.find_similar('中国', wdict, index)
+    self.assertListEqual(result, ['中国人'])
+
+  def test_find_similar_missing(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    with self.assertRaises(KeyError):
+      index.find_similar('日本')
+
+  def test_find_similar_hamming(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    for w in list(wdict) + ['日本', '美人', '中国人民']:
+      expected = similarity.find_similar_hamming(w, wdict)
+      result = similarity.find_similar_hamming(w, wdict, index)
+      self.assertSetEqual(expected, result, w)
+
+  def test_find_similar_same_chars(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    for w in list(wdict) + ['日本', '美人']:
+      expected = similarity.find_similar_same_chars(w, wdict)
+      result = similarity.find_similar_same_chars(w, wdict, index)
+      self.assertSetEqual(expected, result, w)
+
+  def test_find_homophones(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    self.assertSetEqual(index.find_homophones('中心'), {'忠心'})
+    self.assertSetEqual(index.find_homophones('中国'), set())
+
+  def test_find_similar_pinyin(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    self.assertSetEqual(index.find_similar_pinyin('中心'), {'忠心'})
+    # The traditional form has the same simplified form, so is left out
+    self.assertSetEqual(index.find_similar_pinyin('中国'),
+                        {'中国人', '美国', '中文', '英国', '中心', '忠心'})
+    self.assertSetEqual(index.find_similar_pinyin('人'), {'国'})
+    with self.assertRaises(KeyError):
+      index.find_similar_pinyin('日本')
+
+  def test_syllable_distance(self):
+    segmenter = PinyinSegmenter()
+    zhongguo = segmenter.encode('Zhōngguó')
+    self.assertEqual(similarity.syllable_distance(
+        zhongguo, segmenter.encode('zhòngguó')), 1)
+    self.assertEqual(similarity.syllable_distance(
+        zhongguo, segmenter.encode('zhòngguó'), tones=False), 0)
+    self.assertEqual(similarity.syllable_distance(
+        zhongguo, segmenter.encode('Zhōngguórén')), 1)
+
+  def test_top_relevant(self):
+    wdict = make_dict()
+    wdict['中国大陆'] = DictionaryEntry('中国大陆', [], '12')
+    index = similarity.SimilarityIndex(wdict)
+    model = similarity.RelevanceModel(MODEL)
+    result = index.top_relevant('中国人民', 3, model)
+    self.assertListEqual(result, [('中国人', 0.7), ('中国', 0.1),
+                                  ('中国大陆', 0.1)])
+    self.assertListEqual(index.top_relevant('中国人民', 0, model), [])
+
+  def test_top_relevant_repeated_chars(self):
+    """A character repeated in the query is counted once, as in training"""
+    index = similarity.SimilarityIndex(make_dict())
+    model = similarity.RelevanceModel(MODEL)
+    # Counting 中 twice would give a unigram count of 3 and a score of 0.7
+    self.assertListEqual(index.top_relevant('中中国', 1, model),
+                         [('中国', 0.1)])
+
+  def test_relevance_model(self):
+    model = similarity.RelevanceModel(MODEL)
+    self.assertEqual(model.max_score, 0.7)
+    self.assertEqual(model.score((3, 2, 4)), 0.7)
+    self.assertEqual(model.score((3, 10, 12)), 0.3)
+    self.assertEqual(model.score((1, 2, 4)), 0.1)
+    with self.assertRaises(ValueError):
+      similarity.RelevanceModel({'feature_names': ['Unigram count'],
+                                 'nodes': []})
+
+  def test_top_same_chars(self):
+    wdict = make_dict()
+    index = similarity.SimilarityIndex(wdict)
+    result = index.top_same_chars('中国人', 3)
+    self.assertListEqual(result, [('中国', 2), ('中文', 1), ('美国', 1)])
+
+
+class CachedSimilarityTest(unittest.TestCase):
+
+  def test_find_similar(self):
+    """Repeated queries are answered from the cache"""
+    similar = similarity.CachedSimilarity(make_dict(), maxsize=2)
+    self.assertListEqual(similar.find_similar('中国'), ['中国人'])
+    self.assertListEqual(similar.find_similar('中国'), ['中国人'])
+    self.assertEqual(similar.cache.hits, 1)
+    self.assertEqual(similar.cache.misses, 1)
+
+  def test_set_dictionary(self):
+    """Results for the previous dictionary are not returned"""
+    wdict = make_dict()
+    similar = similarity.CachedSimilarity(wdict)
+    similar.find_similar('中国')
+    self.assertEqual(len(similar.cache), 1)
+    del wdict['中国人']
+    similar.set_dictionary(wdict)
+    self.assertEqual(similar.version, 2)
+    self.assertEqual(len(similar.cache), 0)
+    expected = similarity.find_similar('中国', wdict)
+    self.assertSetEqual(set(similar.find_similar('中国')), set(expected))
+    self.assertEqual(similar.cache.hits, 0)
+
+
+class ShardedSimilarityTest(unittest.TestCase):
+
+  def test_find_similar(self):
+    """Same results as the serial search for any number of shards"""
+    wdict = make_dict()
+    for shards in (1, 2, 3, len(wdict)):
+      sharded = similarity.ShardedSimilarity(wdict, processes=1, shards=shards)
+      for w in wdict:
+        expected = similarity.find_similar(w, wdict)
+        self.assertSetEqual(set(sharded.find_similar(w)), set(expected),
+                            (shards, w))
+
+  def test_find_similar_pool(self):
+    wdict = make_dict()
+    with similarity.ShardedSimilarity(wdict, processes=2) as sharded:
+      self.assertEqual(sharded.num_shards, 2)
+      self.assertListEqual(sharded.find_similar('中国'), ['中国人'])
+
+  def test_find_similar_missing(self):
+    sharded = similarity.ShardedSimilarity(make_dict(), processes=1)
+    with self.assertRaises(KeyError):
+      sharded.find_similar('日本')
+
+
+class FeatureExtractorTest(unittest.TestCase):
+
+  PAIRS = [('中国', '中國'), ('中国', '美国'), ('国人', '中国人'),
+           ('中心', '忠心'), ('中中', '中国')]
+
+  def test_extract(self):
+    wdict = make_dict()
+    wdict['国家'].senses[0].notes = 'Compare 中国'
+    features = similarity.FeatureExtractor(wdict).extract(
+        self.PAIRS + [('中国', '国家')])
+    self.assertListEqual(list(features['Query']),
+                         [q for q, _ in self.PAIRS] + ['中国'])
+    self.assertListEqual(list(features['Rank']), [1, 2, 1, 1, 1, 1])
+    self.assertListEqual(list(features['Pinyin Match']),
+                         [True, False, False, True, False, False])
+    self.assertListEqual(list(features['In Notes']),
+                         [False, False, False, False, False, True])
+    self.assertListEqual(list(features['Unigram Count']), [1, 1, 2, 1, 1, 1])
+    self.assertListEqual(list(features['Hamming']), [1, 1, 3, 1, 1, 2])
+    self.assertListEqual(list(features['Is Substring']),
+                         [False, False, True, False, False, False])
+
+  def test_extract_same_as_batch(self):
+    """Same features as similarity_batch, repeated characters counted once"""
+    terms = list(make_dict())
+    extractor = similarity.FeatureExtractor(make_dict(), chunk_size=4)
+    scorer = similarity_batch.BatchScorer(terms)
+    for query in ['中国', '中国人民', '国', '', '中中国']:
+      features = extractor.extract([(query, key) for key in scorer.keys])
+      hamming, unigram, substring = scorer.score(query)
+      self.assertListEqual(list(features['Hamming']), list(hamming), query)
+      self.assertListEqual(list(features['Is Substring']), list(substring),
+                           query)
+      self.assertListEqual(list(features['Unigram Count']), list(unigram),
+                           query)
+
+  def test_extract_length_groups(self):
+    """Pairs of mixed lengths, scored in NumPy and in Python, stay in order"""
+    queries = ['中中国', '中国', '国人', '中国人民', '', '人人']
+    terms = ['中国', '国中', '人', '中国', '中', '人民人', '人国人民']
+    pairs = [(q, t) for q in queries for t in terms] * 3
+    for chunk_size in [2, 1000]:
+      extractor = similarity.FeatureExtractor(make_dict(),
+                                              chunk_size=chunk_size)
+      features = extractor.extract(pairs)
+      self.assertListEqual(
+          list(features['Unigram Count']),
+          [len({c for c in q if c in t}) for q, t in pairs])
+      self.assertListEqual(
+          list(features['Hamming']),
+          [max(len(q), len(t)) - sum(a == b for a, b in zip(q, t))
+           for q, t in pairs])
+
+  def test_regenerate_features(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      infile = os.path.join(tmpdir, 'in.csv')
+      outfile = os.path.join(tmpdir, 'out.csv')
+      with open(infile, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Query', 'Rank', 'Term', 'Is Relevant'])
+        writer.writerow(['中国', '3', '中國', '1'])
+      similarity.regenerate_features(infile, outfile, make_dict())
+      with open(outfile, 'r', newline='') as f:
+        rows = list(csv.reader(f))
+    self.assertListEqual(rows[0], similarity.TRAINING_COLUMNS)
+    self.assertListEqual(rows[1], ['中国', '3', '中國', '1', '0', '1', '1',
+                                   '0', '1'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,140 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Unit tests for chinesenotes.trie
+"""
+
+import unittest
+
+from chinesenotes import trie
+
+DICT_ENTRIES = ['zha', 'zhang', 'zhan', 'zhao', 'fang']
+
+class TrieTest(unittest.TestCase):
+
+  def test_find_with_prefix(self):
+    """All completions are found"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    terms = t.find_with_prefix('zh')
+    self.assertEqual(set(terms), {'zha', 'zhang', 'zhan', 'zhao'})
+
+  def test_find_with_prefix_ordered(self):
+    """Completions in lexicographic order, up to the limit"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    self.assertEqual(t.find_with_prefix('zh', ordered=True),
+                     ['zha', 'zhan', 'zhang', 'zhao'])
+    self.assertEqual(t.find_with_prefix('zh', limit=2, ordered=True),
+                     ['zha', 'zhan'])
+
+  def test_build_sorted(self):
+    """Sorted construction gives the same trie as inserting one by one"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    s = trie.Trie()
+    s.build_sorted(sorted(DICT_ENTRIES + ['zhan']))
+    self.assertEqual(len(s.states), len(t.states))
+    self.assertEqual(len(s.transitions), len(t.transitions))
+    self.assertEqual(s.find_with_prefix('zh', ordered=True),
+                     ['zha', 'zhan', 'zhang', 'zhao'])
+    self.assertTrue(s.recognizes('fang'))
+    self.assertFalse(s.recognizes('fan'))
+
+  def test_build_sorted_out_of_order(self):
+    """Keys out of order are rejected"""
+    t = trie.Trie()
+    with self.assertRaises(trie.FSMException):
+      t.build_sorted(['zhang', 'zha'])
+
+  def test_compile(self):
+    """The compiled automaton recognizes the same strings"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES + ['中国', '中國'])
+    compiled = t.compile()
+    self.assertEqual(compiled.num_states, len(t.states))
+    for word in DICT_ENTRIES + ['中国', '中國', '', 'zh', 'zhangs', '中', '国']:
+      self.assertEqual(compiled.recognizes(word), t.recognizes(word), word)
+
+  def test_compile_nondeterministic(self):
+    """Subset construction resolves multiple next states"""
+    fsm = trie.FSM()
+    s1 = fsm.new_state()
+    s2 = fsm.new_state(True)
+    s3 = fsm.new_state(True)
+    fsm.add_transitions(fsm.start, 'a', {s1, s2})
+    fsm.add_transition(s1, 'b', s3)
+    fsm.add_transition(s2, 'c', s3)
+    with self.assertRaises(trie.FSMException):
+      fsm.recognizes('ab')
+    compiled = fsm.compile()
+    self.assertTrue(compiled.recognizes('a'))
+    self.assertTrue(compiled.recognizes('ab'))
+    self.assertTrue(compiled.recognizes('ac'))
+    self.assertFalse(compiled.recognizes('abc'))
+    self.assertFalse(compiled.recognizes(''))
+
+  def test_find_fuzzy(self):
+    """Terms within the edit distance, nearest first"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES + ['中国', '中國', '美国'])
+    self.assertEqual(t.find_fuzzy('zhan', 0), [('zhan', 0)])
+    self.assertEqual(t.find_fuzzy('zhan', 1),
+                     [('zhan', 0), ('zha', 1), ('zhang', 1), ('zhao', 1)])
+    self.assertEqual(t.find_fuzzy('中国', 1),
+                     [('中国', 0), ('中國', 1), ('美国', 1)])
+    self.assertEqual(t.find_fuzzy('xyz', 1), [])
+
+  def test_fuzzy_walk(self):
+    """Same terms as find_fuzzy, with a count of the transitions followed"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES + ['中国', '中國', '美国'])
+    terms, visited = t.fuzzy_walk('中国', 1)
+    self.assertEqual(terms, t.find_fuzzy('中国', 1))
+    self.assertGreater(visited, 0)
+    _, visited_exact = t.fuzzy_walk('中国', 0)
+    self.assertLess(visited_exact, visited)
+
+  def test_find_with_prefix_missing(self):
+    """No completions for a prefix not in the trie"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    self.assertEqual(t.find_with_prefix('x'), [])
+
+  def test_recognizes(self):
+    """Only the dictionary terms are recognized"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    self.assertTrue(t.recognizes('zhan'))
+    self.assertFalse(t.recognizes('zh'))
+
+  def test_top_k(self):
+    """Most frequent completions first, ties in lexicographic order"""
+    t = trie.Trie()
+    t.build(DICT_ENTRIES)
+    t.set_frequencies({'zha': 5, 'zhang': 20, 'zhan': 8, 'zhao': 8,
+                       'fang': 30, 'zz': 100})
+    self.assertEqual(t.top_k('zh', 2), [('zhang', 20), ('zhan', 8)])
+    self.assertEqual(t.top_k('zh', 10), [('zhang', 20), ('zhan', 8),
+                                         ('zhao', 8), ('zha', 5)])
+    self.assertEqual(t.top_k('', 1), [('fang', 30)])
+    self.assertEqual(t.top_k('x', 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()